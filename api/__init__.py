@@ -20,32 +20,102 @@ logging.basicConfig(
 )
 
 
-from flask import send_from_directory, abort
-
-app = Flask(__name__)
-CORS(app)
-api = Api(app)
-
-# Например, все статичные файлы лежат в каталоге "static" в корне проекта.
-@app.route('/uploads/<path:filename>')
-def static_files(filename):
-    static_dir = os.path.join(os.getcwd(), 'uploads')
-    if os.path.isfile(os.path.join(static_dir, filename)):
-        return send_from_directory(static_dir, filename)
-    else:
-        abort(404)
-
-@app.errorhandler(Exception)
-def handle_exception(e):
+from flask import g
+from werkzeug.exceptions import HTTPException
+
+
+def registerResources(api):
+    # Импортируем ресурсы здесь: модули обработчиков сами импортируют пакет api
+    from api.handlers.register import Register
+    from api.handlers.login import Login
+    from api.handlers.profile import Profile
+    from api.handlers.cards import Cards
+    from api.handlers.categories import Categories
+    from api.handlers.favorites import Favorites, FavoritesBatch, FavoritesCheck
+    from api.handlers.tariffs import Tariffs
+    from api.handlers.payments import PaymentsGenerate, PaymeWebhook
+    from api.handlers.categoryProducts import CategoriesWithCards
+    from api.handlers.cardSearch import CardSearch
+    from api.handlers.cardNearby import CardNearby
+    from api.handlers.cardImport import CardImport
+    from api.handlers.metrics import Metrics
+
+    api.add_resource(Register, '/api/register')  # POST, PUT
+    api.add_resource(Login, '/api/login')        # POST
+    api.add_resource(Profile, '/api/profile')    # GET
+    api.add_resource(Cards, '/api/cards')        # POST,GET,PUT,DELETE
+    api.add_resource(Categories, '/api/categories')  # POST,GET,PUT,DELETE
+    api.add_resource(Favorites, '/api/favorites') # POST, GET, DELETE
+    api.add_resource(FavoritesBatch, '/api/favorites/batch')  # POST
+    api.add_resource(FavoritesCheck, '/api/favorites/check')  # GET
+    api.add_resource(Tariffs, '/api/tariffs')     # POST, GET, PUT, DELETE
+    api.add_resource(PaymentsGenerate, "/api/payments/generate")  # POST
+    api.add_resource(PaymeWebhook, '/api/payments/webhook')  # POST
+    api.add_resource(CategoriesWithCards, '/api/categories/with_cards')
+    api.add_resource(CardSearch, '/api/cards/search')  # GET
+    api.add_resource(CardNearby, '/api/cards/nearby')  # GET
+    api.add_resource(CardImport, '/api/admin/cards/import')  # POST
+    api.add_resource(Metrics, '/api/admin/metrics')  # GET
+
+
+def createApp():
+    """
+    Фабрика приложения: создаёт Flask-приложение со всеми ресурсами.
+    Используется и dev-сервером (main.py), и production-запуском (serve.py).
+    """
+    app = Flask(__name__)
+    CORS(app)
+    api = Api(app)
+    registerResources(api)
+
+    # Загруженные файлы лежат в static/uploads (см. api/static.py)
+    from api.static import serveUpload
+    from data.config import staticOffload
+    app.config['USE_X_SENDFILE'] = staticOffload == 'x-sendfile'
+    app.add_url_rule('/uploads/<path:filename>', 'static_files', serveUpload)
+
+    @app.after_request
+    def add_server_timing(response):
+        # Время проверки токена (см. api/auth.py) – видно в DevTools / логах прокси
+        authTime = g.get('authTime')
+        if authTime is not None:
+            response.headers.add('Server-Timing', f'auth;dur={authTime * 1000:.2f}')
+        return response
+
+    @app.errorhandler(Exception)
+    def handle_exception(e):
+        """
+        Глобальный обработчик всех неперехваченных исключений.
+        Возвращает единый JSON-ответ вместо HTML-трейсбека.
+        """
+        if isinstance(e, HTTPException):
+            # 404/405 и т.п. – отдаём как есть, это не ошибка сервера
+            return e
+        logging.error(f"Global exception caught: {e}")
+        # Для безопасности можно не возвращать e.__str__()
+        # Но если нужно отладить, можно добавить e.__str__() или traceback.format_exc().
+        return jsonify({
+            "message": "На сервере произошла ошибка, пожалуйста обратитесь к разработчику",
+            "error": str(e),  # или уберите для продакшна
+            "status": False
+        }), 500
+
+    return app
+
+
+def warmUp():
     """
-    Глобальный обработчик всех неперехваченных исключений.
-    Возвращает единый JSON-ответ вместо HTML-трейсбека.
+    Дешёвый прогрев воркера после fork: открывает соединения пула и загружает
+    справочники, чтобы первый запрос не платил за подключение к MySQL.
     """
-    logging.error(f"Global exception caught: {e}")
-    # Для безопасности можно не возвращать e.__str__()
-    # Но если нужно отладить, можно добавить e.__str__() или traceback.format_exc().
-    return jsonify({
-        "message": "На сервере произошла ошибка, пожалуйста обратитесь к разработчику",
-        "error": str(e),  # или уберите для продакшна
-        "status": False
-    }), 500
\ No newline at end of file
+    from data import db
+    from api.mailer import startOutboxWorker
+
+    pool = db.getPool()
+    conns = [conn for conn in (db.connect() for _ in range(pool.size)) if conn]
+    for conn in conns:
+        conn.close()
+    db.Categories.getAllCategories()
+    db.TariffsDB.getAllTariffs()
+    startOutboxWorker()
+    logging.info(f"Воркер pid={os.getpid()} прогрет: соединений в пуле {len(conns)}")
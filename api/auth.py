@@ -0,0 +1,131 @@
+from flask import request, g
+from functools import wraps
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import time
+import jwt
+from data.config import jwtSecretKey, authCacheSize, adminUserIds
+
+
+class VerifiedTokenCache:
+    """
+    LRU уже проверенных JWT: ключ – sha256 токена (сами токены в памяти не держим),
+    значение – payload. Запись живёт до exp токена, поэтому повторные запросы
+    с тем же токеном не пересчитывают HMAC.
+    """
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "authTimeTotal": 0.0, "requests": 0}
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            payload, expiresAt = entry
+            if expiresAt <= time.time():
+                del self._entries[key]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return payload
+
+    def put(self, token, payload):
+        expiresAt = payload.get('exp')
+        if not expiresAt or self.maxSize <= 0:
+            # Без exp кэшировать нельзя – запись жила бы вечно
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, float(expiresAt))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+
+    def recordTime(self, seconds):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["authTimeTotal"] += seconds
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+            result["size"] = len(self._entries)
+        return result
+
+
+tokenCache = VerifiedTokenCache(authCacheSize)
+
+def getAuthStats():
+    return tokenCache.stats()
+
+def authenticate():
+    """
+    Проверяет токен из заголовка Authorization (допускается префикс Bearer).
+    Возвращает (payload, None) или (None, (тело ответа, 401)).
+    Время проверки сохраняется в g.authTime.
+    """
+    started = time.perf_counter()
+    try:
+        token = request.headers.get('Authorization')
+        if token and token.startswith('Bearer '):
+            token = token[len('Bearer '):]
+        if not token:
+            return None, ({"message": "Token is missing"}, 401)
+
+        payload = tokenCache.get(token)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
+            except jwt.ExpiredSignatureError:
+                return None, ({"message": "Token has expired"}, 401)
+            except jwt.InvalidTokenError:
+                return None, ({"message": "Invalid token"}, 401)
+            tokenCache.put(token, payload)
+
+        if not payload.get('userId'):
+            return None, ({"message": "Invalid token payload"}, 401)
+        return payload, None
+    finally:
+        g.authTime = time.perf_counter() - started
+        tokenCache.recordTime(g.authTime)
+
+def authRequired(func):
+    """
+    Декоратор методов Resource: проверяет JWT и кладёт данные пользователя
+    в g.user (payload токена) и g.userId.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        payload, error = authenticate()
+        if error:
+            logging.warning(f"Отказ в авторизации: {error[0]['message']}")
+            return error
+        g.user = payload
+        g.userId = payload['userId']
+        return func(*args, **kwargs)
+    return wrapper
+
+def adminRequired(func):
+    """
+    Как authRequired, но пропускает только пользователей из adminUserIds (data.config).
+    """
+    @wraps(func)
+    @authRequired
+    def wrapper(*args, **kwargs):
+        if g.userId not in adminUserIds:
+            logging.warning(f"Отказ в доступе администратора: userId={g.userId}")
+            return {"message": "Forbidden"}, 403
+        return func(*args, **kwargs)
+    return wrapper
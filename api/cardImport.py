@@ -0,0 +1,212 @@
+"""
+Массовый импорт карточек из CSV или NDJSON.
+Используется CLI (importCards.py) и POST /api/admin/cards/import.
+
+CSV: заголовок с колонками
+    userId, categoryId, tariffId, cardName, description, address,
+    locationLat, locationLng, website, phoneNumbers, socialMedias, photoUrls
+  - phoneNumbers, photoUrls – значения через ';'
+  - socialMedias – JSON-массив [{"socialType": ..., "socialLink": ...}]
+NDJSON: по одному JSON-объекту на строку с теми же полями, списки – массивами.
+
+userId можно не указывать – тогда карточки достаются ownerId.
+Каждая запись проверяется по лимитам тарифа (api/cardRules.py),
+корректные записи пишутся блоками по importChunkSize в одной транзакции.
+"""
+import csv
+import json
+import logging
+import time
+
+from data import db
+from data.config import importChunkSize
+from api.cardRules import checkTariffRules
+
+FORMATS = ("csv", "ndjson")
+LIST_SEPARATOR = ";"
+MAX_REPORTED_ERRORS = 1000
+
+
+def detectFormat(filename):
+    """Формат по расширению файла: .csv -> csv, .ndjson/.jsonl -> ndjson."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def readRecords(stream, fmt):
+    """
+    Читает текстовый поток, отдаёт (номер строки, словарь или None, ошибка разбора или None).
+    Битый CSV или не UTF-8 дальше читать нельзя: отдаётся последняя запись с ошибкой,
+    и чтение останавливается (уже записанные блоки остаются в базе).
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            for raw in reader:
+                yield reader.line_num, raw, None
+        except (csv.Error, UnicodeDecodeError) as e:
+            yield reader.line_num + 1, None, f"Файл не удалось прочитать дальше, импорт остановлен: {e}"
+    else:
+        lineNumber = 0
+        try:
+            for lineNumber, line in enumerate(stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield lineNumber, None, f"Некорректный JSON: {e}"
+                    continue
+                if not isinstance(raw, dict):
+                    yield lineNumber, None, "Ожидается JSON-объект"
+                    continue
+                yield lineNumber, raw, None
+        except UnicodeDecodeError as e:
+            yield lineNumber + 1, None, f"Файл не удалось прочитать дальше, импорт остановлен: {e}"
+
+
+def _asList(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def _asSocials(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValueError("socialMedias должен быть массивом")
+    socials = []
+    for sm in value:
+        sType = str(sm.get('socialType', '')).strip()
+        sLink = str(sm.get('socialLink', '')).strip()
+        if sType and sLink:
+            socials.append({"socialType": sType, "socialLink": sLink})
+    return socials
+
+
+def _asCoordinate(value, limit):
+    if value is None or value == "":
+        return None
+    number = float(value)
+    if not (-limit <= number <= limit):
+        raise ValueError(f"координата вне диапазона ±{limit}")
+    return number
+
+
+def validateRecord(raw, ownerId, categoryIds):
+    """
+    Приводит запись к виду Cards.importCardChunk и проверяет лимиты тарифа.
+    Возвращает (record, None) или (None, текст ошибки).
+    """
+    try:
+        userId = int(raw.get('userId') or ownerId)
+        categoryId = int(raw.get('categoryId'))
+        tariffId = int(raw.get('tariffId'))
+        locationLat = _asCoordinate(raw.get('locationLat'), 90)
+        locationLng = _asCoordinate(raw.get('locationLng'), 180)
+        phoneNumbers = [str(phone) for phone in _asList(raw.get('phoneNumbers'))]
+        photoUrls = [str(url) for url in _asList(raw.get('photoUrls'))]
+        socialMedias = _asSocials(raw.get('socialMedias'))
+    except (TypeError, ValueError, AttributeError) as e:
+        return None, f"Некорректные поля: {e}"
+
+    cardName = str(raw.get('cardName') or '').strip()
+    description = str(raw.get('description') or '')
+    address = str(raw.get('address') or '')
+    website = str(raw.get('website') or '')
+    if not cardName:
+        return None, "cardName is required"
+    if not description:
+        return None, "description is required"
+    if not address:
+        return None, "address is required"
+    if categoryId not in categoryIds:
+        return None, f"Категория с ID={categoryId} не найдена"
+
+    tariffRow = db.TariffsDB.getTariffById(tariffId)
+    if not tariffRow:
+        return None, f"Тариф с ID={tariffId} не найден"
+    ruleError = checkTariffRules(tariffRow, description, website,
+                                 len(phoneNumbers), len(socialMedias), len(photoUrls))
+    if ruleError:
+        return None, ruleError
+
+    return {
+        "userId": userId,
+        "categoryId": categoryId,
+        "tariffId": tariffId,
+        "cardName": cardName,
+        "description": description,
+        "address": address,
+        "locationLat": locationLat,
+        "locationLng": locationLng,
+        "website": website,
+        "phoneNumbers": phoneNumbers,
+        "socialMedias": socialMedias,
+        "photoUrls": photoUrls
+    }, None
+
+
+def importCards(stream, fmt, ownerId, chunkSize=None):
+    """
+    Импортирует все записи из потока. Возвращает отчёт:
+    {"total", "imported", "failed", "errors": [{"row", "message"}], "seconds", "rowsPerSecond"}.
+    Если блок не записался, он повторяется по одной записи,
+    чтобы ошибка досталась конкретной строке, а остальные записи сохранились.
+    """
+    chunkSize = chunkSize or importChunkSize
+    categoryIds = {row["categoryId"] for row in db.Categories.getAllCategories()}
+    started = time.perf_counter()
+    report = {"total": 0, "imported": 0, "failed": 0, "errors": []}
+    pending = []
+
+    def addError(rowNumber, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": rowNumber, "message": message})
+
+    def flush():
+        cardIds, error = db.Cards.importCardChunk([record for _, record in pending])
+        if cardIds is not None:
+            report["imported"] += len(cardIds)
+        else:
+            for rowNumber, record in pending:
+                ids, rowError = db.Cards.importCardChunk([record])
+                if ids is None:
+                    addError(rowNumber, rowError)
+                else:
+                    report["imported"] += 1
+        pending.clear()
+        elapsed = time.perf_counter() - started
+        logging.info(f"Импорт карточек: {report['imported']} записано, {report['failed']} с ошибками, "
+                     f"{report['total'] / elapsed if elapsed else 0:.0f} строк/с")
+
+    for rowNumber, raw, parseError in readRecords(stream, fmt):
+        report["total"] += 1
+        if parseError:
+            addError(rowNumber, parseError)
+            continue
+        record, error = validateRecord(raw, ownerId, categoryIds)
+        if error:
+            addError(rowNumber, error)
+            continue
+        pending.append((rowNumber, record))
+        if len(pending) >= chunkSize:
+            flush()
+    if pending:
+        flush()
+
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["rowsPerSecond"] = round(report["total"] / seconds, 1) if seconds else None
+    return report
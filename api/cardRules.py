@@ -0,0 +1,30 @@
+"""
+Ограничения тарифа для карточки (таблица tariffs).
+Общие для POST/PUT /api/cards и массового импорта (api/cardImport.py).
+"""
+
+def checkTariffRules(tariffRow, description, website, phoneCount, socialCount, photoCount):
+    """
+    Проверяет описание, website и количество телефонов/соцсетей/фото
+    по лимитам тарифа. Возвращает текст ошибки или None.
+    """
+    maxDesc = tariffRow['maxDescriptionLength']
+    if len(description or '') > maxDesc:
+        return f"Описание превышает лимит {maxDesc} символов для данного тарифа"
+
+    if not tariffRow['websiteAllowed'] and website:
+        return "В данном тарифе нельзя указывать website"
+
+    minPhones, maxPhones = tariffRow['minPhones'], tariffRow['maxPhones']
+    if not (minPhones <= phoneCount <= maxPhones):
+        return f"Нужно от {minPhones} до {maxPhones} номеров телефона для данного тарифа"
+
+    minSocials, maxSocials = tariffRow['minSocials'], tariffRow['maxSocials']
+    if not (minSocials <= socialCount <= maxSocials):
+        return f"Нужно от {minSocials} до {maxSocials} соцсетей для данного тарифа"
+
+    minPhotos, maxPhotos = tariffRow['minPhotos'], tariffRow['maxPhotos']
+    if not (minPhotos <= photoCount <= maxPhotos):
+        return f"Нужно от {minPhotos} до {maxPhotos} фото для данного тарифа"
+
+    return None
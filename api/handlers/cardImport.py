@@ -0,0 +1,35 @@
+from flask_restful import Resource
+from flask import request, g
+import io
+import logging
+from api.auth import adminRequired
+from api.cardImport import importCards, detectFormat, FORMATS
+
+class CardImport(Resource):
+    """
+    POST /api/admin/cards/import (multipart/form-data) – только для adminUserIds
+      - file – CSV или NDJSON (формат – см. api/cardImport.py)
+      - format – csv | ndjson (по умолчанию по расширению файла)
+      - userId – владелец записей без userId (по умолчанию – текущий администратор)
+    Ответ: {"total", "imported", "failed", "errors": [{"row", "message"}], "seconds", "rowsPerSecond"}
+    Большие файлы лучше загружать через CLI (python importCards.py), без ограничения serverTimeout.
+    """
+    @adminRequired
+    def post(self):
+        upload = request.files.get('file')
+        if not upload:
+            return {"message": "file is required"}, 400
+
+        fmt = request.form.get('format') or detectFormat(upload.filename)
+        if fmt not in FORMATS:
+            return {"message": "format должен быть csv или ndjson"}, 400
+        try:
+            ownerId = int(request.form.get('userId') or g.userId)
+        except ValueError:
+            return {"message": "userId must be integer"}, 400
+
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        report = importCards(stream, fmt, ownerId)
+        logging.info(f"[userId={g.userId}] Импорт карточек: {report['imported']} из {report['total']}, "
+                     f"{report['rowsPerSecond']} строк/с")
+        return report, 200
@@ -0,0 +1,40 @@
+from flask_restful import Resource
+from flask import request
+from data import db
+from api.auth import authRequired
+
+MAX_RADIUS = 50000
+MAX_LIMIT = 100
+
+class CardNearby(Resource):
+    """
+    GET /api/cards/nearby?lat=...&lng=...&radius=...
+      Карточки в радиусе radius метров (по умолчанию 5000, не больше 50000),
+      отсортированные по расстоянию.
+      - categoryId – фильтр по категории
+      - limit (по умолчанию 25, не больше 100)
+      Ответ: {"cards": [...]}, у каждой карточки есть distance в метрах.
+    """
+    @authRequired
+    def get(self):
+        try:
+            lat = float(request.args['lat'])
+            lng = float(request.args['lng'])
+            radius = float(request.args.get('radius', 5000))
+            categoryId = request.args.get('categoryId')
+            categoryId = int(categoryId) if categoryId else None
+            limit = int(request.args.get('limit', 25))
+        except KeyError:
+            return {"message": "lat и lng обязательны"}, 400
+        except ValueError:
+            return {"message": "Некорректные параметры запроса"}, 400
+
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return {"message": "Некорректные координаты"}, 400
+        if not (0 < radius <= MAX_RADIUS):
+            return {"message": f"radius должен быть от 0 до {MAX_RADIUS} метров"}, 400
+        if not (1 <= limit <= MAX_LIMIT):
+            return {"message": f"limit должен быть от 1 до {MAX_LIMIT}"}, 400
+
+        cards = db.Cards.getNearbyCards(lat, lng, radius, categoryId=categoryId, limit=limit)
+        return {"cards": cards}, 200
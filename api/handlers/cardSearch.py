@@ -0,0 +1,42 @@
+from flask_restful import Resource
+from flask import request
+from data import db
+from api.auth import authRequired
+
+MAX_QUERY_LENGTH = 100
+MAX_PER_PAGE = 50
+
+class CardSearch(Resource):
+    """
+    GET /api/cards/search?q=...
+      Полнотекстовый поиск карточек по названию, описанию и адресу,
+      отсортированный по релевантности.
+      - q (обязательно) – строка поиска
+      - categoryId – фильтр по категории
+      - perPage (по умолчанию 25, не больше 50)
+      - cursor – nextCursor из предыдущего ответа
+      Ответ: {"cards": [...], "nextCursor": ...}
+    """
+    @authRequired
+    def get(self):
+        queryText = request.args.get('q', '').strip()
+        if not queryText:
+            return {"message": "q is required"}, 400
+        if len(queryText) > MAX_QUERY_LENGTH:
+            return {"message": f"q не должен превышать {MAX_QUERY_LENGTH} символов"}, 400
+
+        categoryId = request.args.get('categoryId')
+        try:
+            categoryId = int(categoryId) if categoryId else None
+            perPage = int(request.args.get('perPage', 25))
+        except ValueError:
+            return {"message": "categoryId и perPage должны быть целыми числами"}, 400
+        if not (1 <= perPage <= MAX_PER_PAGE):
+            return {"message": f"perPage должен быть от 1 до {MAX_PER_PAGE}"}, 400
+
+        try:
+            result = db.Cards.searchCards(queryText, categoryId=categoryId,
+                                          cursorToken=request.args.get('cursor'), perPage=perPage)
+        except ValueError:
+            return {"message": "Некорректный cursor"}, 400
+        return result, 200
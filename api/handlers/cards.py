@@ -1,15 +1,12 @@
 from flask_restful import Resource
-from flask import request
+from flask import request, g
 import logging
-import jwt
-import os
 import json
-import time
-from werkzeug.utils import secure_filename
-from data.config import jwtSecretKey
+from flask import Response
 from data import db
-
-UPLOAD_FOLDER = './static/uploads/cards/'  # Папка, куда сохраняем фото
+from api.auth import authRequired
+from api.cardRules import checkTariffRules
+from api.images import storeImageUpload, CARD_PHOTO_VARIANTS, InvalidImageError
 
 class Cards(Resource):
     """
@@ -18,40 +15,48 @@ class Cards(Resource):
       - categoryId, cardName, description, address - обязательные
       - website, locationLat, locationLng - опциональные
       - phoneNumbers[] (list), socialMedias[] (list of JSON), photos (files)
+      - Для каждого фото создаются превью thumb/detail (WebP, без EXIF),
+        в ответах GET они лежат в photoVariants рядом с photos
       - Валидация происходит на основе таблицы tariffs (minPhones/maxPhones, и т.д.)
 
     GET /api/cards -> получение карточек с фильтрами:
-      - ?cardId=... (конкретная карточка)
+      - ?cardId=... (конкретная карточка; поддерживает If-None-Match –
+        при неизменной карточке вернётся 304 без тела)
       - ?categoryId=... (по категории)
       - ?userId=... (по пользователю)
       - ?myCards=true (если нужно только карточки текущего пользователя)
       - page, perPage для пагинации (по умолчанию 1 и 25)
+      - ?sort=recent (по умолчанию, новые первыми) | popular (по favoriteCount –
+        сколько раз карточку добавили в избранное; счётчик хранится в cards)
+      - ?cursor=... – курсорный режим (вместо page): без подсчёта pages,
+        в ответе nextCursor; для первой страницы передайте пустой cursor=
 
     PUT /api/cards -> обновление (form-data), аналогично POST
       - Нужно указать cardId
       - Если хотим изменить тариф, передаём новый tariffId
-      - phoneNumbers, socialMedias, photos перезаписываются (удаляем, вставляем заново)
+      - phoneNumbers, socialMedias – итоговые списки; в БД удаляются только
+        исчезнувшие записи и добавляются только новые
+      - keepPhotos[] – photoUrl или blobId уже загруженных фото, которые остаются
+        (их не нужно загружать заново); photos (files) – новые фото.
+        Фото, не указанные в keepPhotos, удаляются
+      - Карточка и все дочерние записи пишутся одной транзакцией (db.CardWriter)
+
+    PATCH /api/cards -> частичное обновление (form-data), передаются только изменения
+      - cardId – обязательный
+      - tariffId, cardName, description, address, locationLat, locationLng, website –
+        только изменившиеся (пустые locationLat/locationLng очищают координаты)
+      - phoneNumbers[] / socialMedias[] – если переданы, это новый список целиком
+      - removePhotos[] – photoUrl или blobId удаляемых фото; photos (files) – добавляемые
+      - Лимиты тарифа проверяются по итоговому состоянию карточки
 
     DELETE /api/cards -> удаление (JSON: {"cardId": N})
 
-    Авторизация: токен в заголовке Authorization (без префикса Bearer)
+    Авторизация: токен в заголовке Authorization (см. api/auth.py)
     """
 
+    @authRequired
     def post(self):
-        # Авторизация
-        token = request.headers.get('Authorization')
-        if not token:
-            logging.warning("Токен не предоставлен")
-            return {"message": "Токен не предоставлен"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            logging.warning("Недействительный или просроченный токен")
-            return {"message": "Недействительный или просроченный токен"}, 401
-
-        userId = payload.get('userId')
-        if not userId:
-            return {"message": "Некорректный токен (отсутствует userId)"}, 401
+        userId = g.userId
 
         # Считываем поля
         form = request.form
@@ -97,89 +102,48 @@ class Cards(Resource):
         if not address:
             return {"message": "address is required"}, 400
 
-        # Проверка описания
-        maxDesc = tariffRow['maxDescriptionLength']
-        if len(description) > maxDesc:
-            return {"message": f"Описание превышает лимит {maxDesc} символов для данного тарифа"}, 400
-
-        # Проверка website
-        if not tariffRow['websiteAllowed'] and website:
-            return {"message": "В данном тарифе нельзя указывать website"}, 400
-
-        # Телефоны
-        minPhones = tariffRow['minPhones']
-        maxPhones = tariffRow['maxPhones']
-        if not (minPhones <= len(phoneNumbers) <= maxPhones):
-            return {"message": f"Нужно от {minPhones} до {maxPhones} номеров телефона для данного тарифа"}, 400
-
-        # Соцсети
-        minSocials = tariffRow['minSocials']
-        maxSocials = tariffRow['maxSocials']
-        if not (minSocials <= len(socialMedias) <= maxSocials):
-            return {"message": f"Нужно от {minSocials} до {maxSocials} соцсетей для данного тарифа"}, 400
-
-        # Фото
-        minPhotos = tariffRow['minPhotos']
-        maxPhotos = tariffRow['maxPhotos']
-        if not (minPhotos <= len(photos) <= maxPhotos):
-            return {"message": f"Нужно от {minPhotos} до {maxPhotos} фото для данного тарифа"}, 400
+        # Лимиты тарифа (описание, website, телефоны, соцсети, фото)
+        ruleError = checkTariffRules(tariffRow, description, website,
+                                     len(phoneNumbers), len(socialMedias), len(photos))
+        if ruleError:
+            return {"message": ruleError}, 400
 
         # Преобразуем
         latVal = float(locationLat) if locationLat else None
         lngVal = float(locationLng) if locationLng else None
         catId = int(categoryId)
 
-        # Создаём карточку
-        cardId = db.Cards.addCard(
-            userId=userId,
-            categoryId=catId,
-            tariffId=tariffId,  # <-- теперь передаём tariffId
-            cardName=cardName,
-            description=description,
-            address=address,
-            locationLat=latVal,
-            locationLng=lngVal,
-            website=website
+        # Фотографии (оригинал + превью для списка и страницы карточки)
+        try:
+            photoUrls = self._savePhotos(photos)
+        except InvalidImageError as e:
+            return {"message": str(e)}, 400
+
+        # Карточка, телефоны, соцсети и фото – одной транзакцией
+        cardId = db.CardWriter.createCard(
+            userId,
+            {
+                "categoryId": catId,
+                "tariffId": tariffId,
+                "cardName": cardName,
+                "description": description,
+                "address": address,
+                "locationLat": latVal,
+                "locationLng": lngVal,
+                "website": website
+            },
+            phoneNumbers, socialMedias, photoUrls
         )
         if not cardId:
-            logging.error("Ошибка при создании карточки (addCard вернул None)")
+            logging.error("Ошибка при создании карточки (createCard вернул None)")
             return {"message": "Ошибка при создании карточки"}, 500
 
-        # Телефоны
-        if not db.Cards.addPhoneNumbers(cardId, phoneNumbers):
-            return {"message": "Ошибка при добавлении телефонов"}, 500
-
-        # Соцсети
-        if not db.Cards.addSocialMedia(cardId, socialMedias):
-            return {"message": "Ошибка при добавлении соцсетей"}, 500
-
-        # Фотографии
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        photoUrls = []
-        for file in photos:
-            filename = secure_filename(file.filename)
-            uniqueName = f"{cardId}_{int(time.time())}_{filename}"
-            file.save(os.path.join(UPLOAD_FOLDER, uniqueName))
-            photoUrl = f"/uploads/cards/{uniqueName}"
-            photoUrls.append(photoUrl)
-
-        if not db.Cards.addPhotos(cardId, photoUrls):
-            return {"message": "Ошибка при сохранении фото"}, 500
-
         logging.info(f"[userId={userId}] Создал карточку cardId={cardId}, тарифId={tariffId}")
         return {"message": "Карточка успешно создана", "cardId": cardId}, 201
 
 
+    @authRequired
     def get(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            return {"message": "Invalid or expired token"}, 401
-
         cardId = request.args.get('cardId')
         categoryId = request.args.get('categoryId')
         filterUserId = request.args.get('userId')
@@ -191,36 +155,40 @@ class Cards(Resource):
             return {"message": "page и perPage должны быть целыми числами"}, 400
 
         if myCards and myCards.lower() == "true":
-            filterUserId = payload.get('userId')
+            filterUserId = g.userId
+
+        sort = request.args.get('sort', 'recent')
+        if sort not in db.CARD_SORTS:
+            return {"message": f"sort должен быть одним из: {', '.join(db.CARD_SORTS)}"}, 400
 
         if cardId:
-            cardData = db.Cards.getCardById(int(cardId))
-            if not cardData:
-                return {"message": "Карточка не найдена"}, 404
-            return cardData, 200
+            return self._getSingleCard(int(cardId))
         else:
             filters = {}
             if categoryId:
                 filters['categoryId'] = int(categoryId)
             if filterUserId:
                 filters['userId'] = int(filterUserId)
-            result = db.Cards.getCards(filters, page=page, perPage=perPage)
+
+            cursorToken = request.args.get('cursor')
+            if cursorToken is not None:
+                if perPage < 1:
+                    return {"message": "perPage должен быть положительным"}, 400
+                try:
+                    result = db.Cards.getCardsByCursor(filters, cursorToken=cursorToken, perPage=perPage, sort=sort)
+                except ValueError:
+                    return {"message": "Некорректный cursor"}, 400
+                # Возвращаем {"cards": [...], "nextCursor": ...}
+                return result, 200
+
+            result = db.Cards.getCards(filters, page=page, perPage=perPage, sort=sort)
             # Возвращаем {"pages": ..., "cards": [...]}
             return result, 200
 
 
+    @authRequired
     def put(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            return {"message": "Invalid or expired token"}, 401
-
-        userId = payload.get('userId')
-        if not userId:
-            return {"message": "Invalid token payload"}, 401
+        userId = g.userId
 
         form = request.form
         cardIdStr = form.get('cardId')
@@ -261,6 +229,8 @@ class Cards(Resource):
             except:
                 pass
         photos = request.files.getlist('photos')
+        # Уже загруженные фото, которые остаются (photoUrl или blobId), без повторов
+        keepPhotos = list(dict.fromkeys(p for p in request.form.getlist('keepPhotos') if p))
 
         if not cardName:
             return {"message": "cardName is required"}, 400
@@ -269,80 +239,116 @@ class Cards(Resource):
         if not address:
             return {"message": "address is required"}, 400
 
-        maxDesc = tariffRow['maxDescriptionLength']
-        if len(description) > maxDesc:
-            return {"message": f"Описание превышает лимит {maxDesc} символов для тарифа ID={tariffId}"}, 400
-
-        if not tariffRow['websiteAllowed'] and website:
-            return {"message": "В данном тарифе нельзя указывать website"}, 400
-
-        minPhones = tariffRow['minPhones']
-        maxPhones = tariffRow['maxPhones']
-        if not (minPhones <= len(phoneNumbers) <= maxPhones):
-            return {"message": f"Нужно от {minPhones} до {maxPhones} телефонов для данного тарифа"}, 400
-
-        minSocials = tariffRow['minSocials']
-        maxSocials = tariffRow['maxSocials']
-        if not (minSocials <= len(socialMedias) <= maxSocials):
-            return {"message": f"Нужно от {minSocials} до {maxSocials} соцсетей для данного тарифа"}, 400
-
-        minPhotos = tariffRow['minPhotos']
-        maxPhotos = tariffRow['maxPhotos']
-        if not (minPhotos <= len(photos) <= maxPhotos):
-            return {"message": f"Нужно от {minPhotos} до {maxPhotos} фото для данного тарифа"}, 400
+        ruleError = checkTariffRules(tariffRow, description, website,
+                                     len(phoneNumbers), len(socialMedias), len(keepPhotos) + len(photos))
+        if ruleError:
+            return {"message": ruleError}, 400
 
         latVal = float(locationLat) if locationLat else None
         lngVal = float(locationLng) if locationLng else None
 
-        okMain = db.Cards.updateCardMainFields(
-            userId=userId,
-            cardId=cardId,
-            tariffId=tariffId,
-            cardName=cardName,
-            description=description,
-            address=address,
-            locationLat=latVal,
-            locationLng=lngVal,
-            website=website
-        )
-        if not okMain:
-            return {"message": "Ошибка при обновлении (не ваша карточка или не найдена)"}, 400
+        try:
+            photoUrls = self._savePhotos(photos)
+        except InvalidImageError as e:
+            return {"message": str(e)}, 400
 
-        # Перезаписываем телефоны / соцсети / фото
-        if not self._overwritePhones(cardId, phoneNumbers):
-            return {"message": "Ошибка при обновлении телефонов"}, 500
+        # Основные поля и изменения телефонов / соцсетей / фото – одной транзакцией
+        try:
+            updated = db.CardWriter.updateCard(
+                userId, cardId,
+                {
+                    "tariffId": tariffId,
+                    "cardName": cardName,
+                    "description": description,
+                    "address": address,
+                    "locationLat": latVal,
+                    "locationLng": lngVal,
+                    "website": website
+                },
+                phoneNumbers, socialMedias, keepPhotos, photoUrls
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if not updated:
+            return {"message": "Ошибка при обновлении (не ваша карточка или не найдена)"}, 400
 
-        if not self._overwriteSocials(cardId, socialMedias):
-            return {"message": "Ошибка при обновлении соцсетей"}, 500
+        logging.info(f"[userId={userId}] Обновил карточку cardId={cardId}, тарифId={tariffId}")
+        return {"message":"Карточка обновлена"}, 200
 
-        if not os.path.exists(UPLOAD_FOLDER):
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        photoUrls = []
-        for file in photos:
-            filename = secure_filename(file.filename)
-            uniqueName = f"{cardId}_{int(time.time())}_{filename}"
-            file.save(os.path.join(UPLOAD_FOLDER, uniqueName))
-            photoUrl = f"/uploads/cards/{uniqueName}"
-            photoUrls.append(photoUrl)
+    @authRequired
+    def patch(self):
+        userId = g.userId
+        form = request.form
+        try:
+            cardId = int(form.get('cardId', ''))
+        except ValueError:
+            return {"message": "cardId is required and must be integer"}, 400
 
-        if not self._overwritePhotos(cardId, photoUrls):
-            return {"message":"Ошибка при обновлении фото"}, 500
+        # Только переданные поля
+        fields = {}
+        try:
+            if 'tariffId' in form:
+                fields['tariffId'] = int(form['tariffId'])
+            for key in ('locationLat', 'locationLng'):
+                if key in form:
+                    fields[key] = float(form[key]) if form[key] else None
+        except ValueError:
+            return {"message": "tariffId, locationLat, locationLng должны быть числами"}, 400
+        for key in ('cardName', 'description', 'address'):
+            if key in form:
+                value = form[key].strip() if key == 'cardName' else form[key]
+                if not value:
+                    return {"message": f"{key} не может быть пустым"}, 400
+                fields[key] = value
+        if 'website' in form:
+            fields['website'] = form['website']
+
+        # Дочерние списки – только если переданы (пустое значение очищает список)
+        phoneNumbers = None
+        if 'phoneNumbers' in form:
+            phoneNumbers = [p for p in form.getlist('phoneNumbers') if p]
+        socialMedias = None
+        if 'socialMedias' in form:
+            socialMedias = []
+            for s in form.getlist('socialMedias'):
+                try:
+                    sm = json.loads(s)
+                except ValueError:
+                    continue
+                if isinstance(sm, dict):
+                    socialMedias.append(sm)
+        removePhotos = list(dict.fromkeys(p for p in form.getlist('removePhotos') if p))
+        photos = request.files.getlist('photos')
 
-        logging.info(f"[userId={userId}] Обновил карточку cardId={cardId}, тарифId={tariffId}")
-        return {"message":"Карточка обновлена"}, 200
+        def validate(merged):
+            tariffRow = db.TariffsDB.getTariffById(merged['tariffId'])
+            if not tariffRow:
+                return f"Тариф с ID={merged['tariffId']} не найден"
+            return checkTariffRules(tariffRow, merged['description'], merged['website'],
+                                    merged['phoneCount'], merged['socialCount'], merged['photoCount'])
 
-    def delete(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message":"Token is missing"}, 401
         try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            return {"message": "Invalid or expired token"}, 401
+            photoUrls = self._savePhotos(photos)
+        except InvalidImageError as e:
+            return {"message": str(e)}, 400
+        try:
+            updated = db.CardWriter.patchCard(
+                userId, cardId, fields,
+                phoneNumbers=phoneNumbers, socialMedias=socialMedias,
+                removePhotos=removePhotos, newPhotos=photoUrls,
+                validate=validate
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if not updated:
+            return {"message": "Ошибка при обновлении (не ваша карточка или не найдена)"}, 400
+
+        logging.info(f"[userId={userId}] Частично обновил карточку cardId={cardId}")
+        return {"message": "Карточка обновлена"}, 200
 
-        userId = payload.get('userId')
-        if not userId:
-            return {"message":"Invalid token payload"}, 401
+    @authRequired
+    def delete(self):
+        userId = g.userId
 
         data = request.get_json(silent=True)
         if not data:
@@ -360,14 +366,35 @@ class Cards(Resource):
 
     # ----------------- Вспомогательные методы ----------------- #
 
-    def _overwritePhones(self, cardId, phoneNumbers):
-        db.Cards.deleteAllPhones(cardId)
-        return db.Cards.addPhoneNumbers(cardId, phoneNumbers)
-
-    def _overwriteSocials(self, cardId, socialMedias):
-        db.Cards.deleteAllSocials(cardId)
-        return db.Cards.addSocialMedia(cardId, socialMedias)
+    def _getSingleCard(self, cardId):
+        """
+        Условный GET одной карточки: сначала дешёвая проверка version,
+        полная загрузка с телефонами, соцсетями и фото – только если карточка изменилась.
+        Валидатор – только ETag: favoriteCount меняет version, но не updatedAt,
+        поэтому Last-Modified / If-Modified-Since отдали бы устаревший счётчик.
+        """
+        probe = db.Cards.getCardVersion(cardId)
+        if not probe:
+            return {"message": "Карточка не найдена"}, 404
+
+        etag = f"{cardId}-{probe['version']}"
+        headers = {
+            "ETag": f'"{etag}"',
+            "Cache-Control": "private, no-cache"
+        }
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        cardData = db.Cards.getCardById(cardId)
+        if not cardData:
+            return {"message": "Карточка не найдена"}, 404
+        return cardData, 200, headers
+
+    def _savePhotos(self, photos):
+        """
+        Сохраняет загруженные фото и их превью в хранилище блобов,
+        возвращает список словарей для CardWriter.
+        """
+        return [storeImageUpload(file, CARD_PHOTO_VARIANTS) for file in photos]
 
-    def _overwritePhotos(self, cardId, photoUrls):
-        db.Cards.deleteAllPhotos(cardId)
-        return db.Cards.addPhotos(cardId, photoUrls)
\ No newline at end of file
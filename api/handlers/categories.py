@@ -1,13 +1,9 @@
 from flask_restful import Resource, reqparse
 from flask import request
 import logging
-import jwt
-import os
-from werkzeug.utils import secure_filename
-from data.config import jwtSecretKey
 from data import db
-
-UPLOAD_FOLDER_CATEGORIES = './static/uploads/categories/'
+from api.auth import authRequired
+from api.images import storeImageUpload, AVATAR_VARIANTS, InvalidImageError
 
 class Categories(Resource):
     """
@@ -21,18 +17,8 @@ class Categories(Resource):
         categories = db.Categories.getAllCategories()
         return categories, 200
 
+    @authRequired
     def post(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
         # Используем form-data для возможности загрузки логотипа
         form = request.form
         categoryName = form.get('categoryName', '').strip()
@@ -42,34 +28,26 @@ class Categories(Resource):
         # Получаем логотип (файл) из form-data
         logoFile = request.files.get('logo')
         logoUrl = None
+        logoThumb = None
+        logoBlobId = None
         if logoFile:
-            if not os.path.exists(UPLOAD_FOLDER_CATEGORIES):
-                os.makedirs(UPLOAD_FOLDER_CATEGORIES, exist_ok=True)
-            filename = secure_filename(logoFile.filename)
-            # Можно уникализировать имя, например, добавив categoryName или timestamp
-            uniqueName = f"{categoryName}_{filename}"
-            logoFile.save(os.path.join(UPLOAD_FOLDER_CATEGORIES, uniqueName))
-            logoUrl = f"/uploads/categories/{uniqueName}"
-
-        categoryId = db.Categories.addCategory(categoryName, logoUrl)
+            try:
+                urls = storeImageUpload(logoFile, AVATAR_VARIANTS)
+            except InvalidImageError as e:
+                return {"message": str(e)}, 400
+            logoUrl = urls["original"]
+            logoThumb = urls["square"]
+            logoBlobId = urls["blobId"]
+
+        categoryId = db.Categories.addCategory(categoryName, logoUrl, logoThumb, logoBlobId)
         if not categoryId:
             return {"message": "Failed to add category"}, 500
 
         logging.info(f"Добавлена категория categoryId={categoryId}, categoryName={categoryName}")
         return {"message": "Category added successfully", "categoryId": categoryId}, 201
 
+    @authRequired
     def put(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
         # Используем form-data для обновления категории
         form = request.form
         categoryId = form.get('categoryId')
@@ -79,33 +57,26 @@ class Categories(Resource):
 
         logoFile = request.files.get('logo')
         logoUrl = None
+        logoThumb = None
+        logoBlobId = None
         if logoFile:
-            if not os.path.exists(UPLOAD_FOLDER_CATEGORIES):
-                os.makedirs(UPLOAD_FOLDER_CATEGORIES, exist_ok=True)
-            filename = secure_filename(logoFile.filename)
-            uniqueName = f"{categoryId}_{filename}"
-            logoFile.save(os.path.join(UPLOAD_FOLDER_CATEGORIES, uniqueName))
-            logoUrl = f"/uploads/categories/{uniqueName}"
-
-        updated = db.Categories.updateCategory(categoryId, categoryName, logoUrl)
+            try:
+                urls = storeImageUpload(logoFile, AVATAR_VARIANTS)
+            except InvalidImageError as e:
+                return {"message": str(e)}, 400
+            logoUrl = urls["original"]
+            logoThumb = urls["square"]
+            logoBlobId = urls["blobId"]
+
+        updated = db.Categories.updateCategory(categoryId, categoryName, logoUrl, logoThumb, logoBlobId)
         if not updated:
             return {"message": "Failed to update category"}, 500
 
         logging.info(f"Обновлена категория categoryId={categoryId}, newName={categoryName}")
         return {"message": "Category updated successfully"}, 200
 
+    @authRequired
     def delete(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
         data = request.get_json()
         if not data:
             return {"message": "No input data provided"}, 400
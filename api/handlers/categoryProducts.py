@@ -1,10 +1,50 @@
 from flask_restful import Resource
-from flask import request
+from flask import request, Response
 import logging
-import jwt
-from data.config import jwtSecretKey
+import json
+import hashlib
+from data.config import catalogCacheTtl, popularCatalogMaxAge
 from data import db
 
+
+def _buildCatalog(sort="recent"):
+    """
+    Собирает ответ /api/categories/with_cards целиком: сериализованное тело
+    и сильный ETag (sha256 тела). None при ошибке БД – такой ответ не кэшируется.
+    """
+    # Каталог пересобирается только после изменений: категории читаем из БД
+    # напрямую, не сбрасывая общий кэш справочников. None при ошибке – иначе
+    # пустой каталог закэшировался бы до следующей смены версии
+    categories = db.Categories._loadAllCategories()
+    if categories is None:
+        return None
+    cardsByCategory = db.Cards.getTopCardsPerCategory(perCategory=10, sort=sort)
+    if cardsByCategory is None:
+        return None
+
+    result = []
+    for cat in categories:
+        catId = cat["categoryId"]
+        result.append({
+            "categoryId": catId,
+            "categoryName": cat["categoryName"],
+            "cards": cardsByCategory.get(catId, [])
+        })
+
+    body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+    return {"body": body, "etag": hashlib.sha256(body).hexdigest()}
+
+# Ответ одинаков для всех клиентов: кэшируем готовые байты.
+# Сбрасывается при изменении карточек, категорий и промо (версия 'catalog').
+# Оба варианта отдают favoriteCount, а он меняется без смены версии каталога,
+# поэтому кэш пересобирается ещё и не реже popularCatalogMaxAge
+catalogCaches = {
+    "recent": db.ReferenceCache('catalog', _buildCatalog,
+                                catalogCacheTtl, maxAge=popularCatalogMaxAge),
+    "popular": db.ReferenceCache('catalog', lambda: _buildCatalog("popular"),
+                                 catalogCacheTtl, maxAge=popularCatalogMaxAge)
+}
+
 class CategoriesWithCards(Resource):
     """
     GET /api/categories/with_cards
@@ -25,28 +65,25 @@ class CategoriesWithCards(Resource):
         },
         ...
       ]
+      ?sort=recent (по умолчанию) | popular – 10 самых популярных карточек
+      категории по favoriteCount. Счётчики favoriteCount в ответе (при любом sort)
+      могут отставать до popularCatalogMaxAge сек.
+      Ответ кэшируется целиком и отдаётся с ETag; при совпадении
+      If-None-Match возвращается 304 без тела.
     """
     def get(self):
-        # Получаем все категории
-        categories = db.Categories.getAllCategories()
-        result = []
-
-        for cat in categories:
-            catId = cat["categoryId"]
-            catName = cat["categoryName"]
-
-            cards = db.Cards.getCards({"categoryId":catId}, perPage=10)
-
-            for c in cards:
-                if "createdAt" in c and c["createdAt"] is not None:
-                    c["createdAt"] = str(c["createdAt"])
-                if "updatedAt" in c and c["updatedAt"] is not None:
-                    c["updatedAt"] = str(c["updatedAt"])
-
-            result.append({
-                "categoryId": catId,
-                "categoryName": catName,
-                "cards": cards
-            })
+        sort = request.args.get('sort', 'recent')
+        if sort not in catalogCaches:
+            return {"message": f"sort должен быть одним из: {', '.join(catalogCaches)}"}, 400
+        # Все категории и по 10 карточек на каждую; повторные запросы – из кэша
+        catalog = catalogCaches[sort].get()
+        if catalog is None:
+            return {"message": "Не удалось загрузить каталог"}, 503
 
-        return result, 200
\ No newline at end of file
+        headers = {"Cache-Control": "public, no-cache"}
+        if request.if_none_match.contains(catalog["etag"]):
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(catalog["body"], mimetype='application/json', headers=headers)
+        response.set_etag(catalog["etag"])
+        return response
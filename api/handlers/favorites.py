@@ -1,9 +1,8 @@
 from flask_restful import Resource, reqparse
-from flask import request
+from flask import request, g
 import logging
-import jwt
-from data.config import jwtSecretKey
 from data import db
+from api.auth import authRequired
 
 class Favorites(Resource):
     """
@@ -15,6 +14,7 @@ class Favorites(Resource):
     Для всех методов требуется JWT-токен в заголовке Authorization.
     """
 
+    @authRequired
     def post(self):
         """
         Добавляет карточку в избранное.
@@ -25,17 +25,7 @@ class Favorites(Resource):
         Заголовок:
           Authorization: Bearer <token>
         """
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
-        userId = payload.get('userId')
+        userId = g.userId
         parser = reqparse.RequestParser()
         parser.add_argument('cardId', type=int, required=True, help='cardId is required')
         args = parser.parse_args()
@@ -48,26 +38,36 @@ class Favorites(Resource):
         logging.info(f"Пользователь {userId} добавил карточку {cardId} в избранное")
         return {"message": "Card added to favorites"}, 201
 
+    @authRequired
     def get(self):
         """
         Получает список избранных карточек для текущего пользователя.
+        ?cursor=... – постраничный режим (для первой страницы передайте пустой cursor=):
+          карточки целиком (телефоны, соцсети, фото), perPage (по умолчанию 25, не больше 100),
+          ответ {"favorites": [...], "nextCursor": ...}
+        Без cursor – прежний полный список.
         Заголовок:
           Authorization: Bearer <token>
         """
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
+        userId = g.userId
+        cursorToken = request.args.get('cursor')
+        if cursorToken is not None:
+            try:
+                perPage = int(request.args.get('perPage', 25))
+            except ValueError:
+                return {"message": "perPage должен быть целым числом"}, 400
+            if not (1 <= perPage <= 100):
+                return {"message": "perPage должен быть от 1 до 100"}, 400
+            try:
+                result = db.FavoritesDB.getFavoritesByCursor(userId, cursorToken=cursorToken, perPage=perPage)
+            except ValueError:
+                return {"message": "Некорректный cursor"}, 400
+            return result, 200
 
-        userId = payload.get('userId')
         favorites = db.FavoritesDB.getFavorites(userId)
         return favorites, 200
 
+    @authRequired
     def delete(self):
         """
         Удаляет карточку из избранного.
@@ -78,17 +78,7 @@ class Favorites(Resource):
         Заголовок:
           Authorization: Bearer <token>
         """
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
-        userId = payload.get('userId')
+        userId = g.userId
         parser = reqparse.RequestParser()
         parser.add_argument('cardId', type=int, required=True, help='cardId is required')
         args = parser.parse_args()
@@ -100,3 +90,77 @@ class Favorites(Resource):
 
         logging.info(f"Пользователь {userId} удалил карточку {cardId} из избранного")
         return {"message": "Favorite removed"}, 200
+
+
+MAX_BATCH_SIZE = 200
+
+def _parseCardIds(values):
+    """
+    Список cardId без повторов. ValueError, если values не список, в нём есть
+    не целые числа (bool, строки, дробные тоже отклоняются) или превышен лимит.
+    """
+    if not isinstance(values, list):
+        raise ValueError("ожидается JSON-массив")
+    if any(isinstance(v, bool) or not isinstance(v, int) for v in values):
+        raise ValueError("cardId должны быть целыми числами")
+    cardIds = list(dict.fromkeys(values))
+    if len(cardIds) > MAX_BATCH_SIZE:
+        raise ValueError(f"Не больше {MAX_BATCH_SIZE} cardId за запрос")
+    return cardIds
+
+
+class FavoritesBatch(Resource):
+    """
+    POST /api/favorites/batch -> добавить и/или удалить несколько карточек разом
+    JSON:
+    {
+      "add": [1, 2, 3],
+      "remove": [4, 5]
+    }
+    Ответ: {"added": N, "removed": N}
+    """
+
+    @authRequired
+    def post(self):
+        userId = g.userId
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {"message": "Ожидается JSON-объект с add / remove"}, 400
+        try:
+            addCardIds = _parseCardIds(data.get('add', []))
+            removeCardIds = _parseCardIds(data.get('remove', []))
+        except ValueError as e:
+            return {"message": f"Некорректный список cardId: {e}"}, 400
+        if not addCardIds and not removeCardIds:
+            return {"message": "add or remove is required"}, 400
+
+        result = db.FavoritesDB.updateFavorites(userId, addCardIds, removeCardIds)
+        if result is None:
+            return {"message": "Failed to update favorites"}, 500
+
+        logging.info(f"Пользователь {userId} изменил избранное: +{result['added']} -{result['removed']}")
+        return result, 200
+
+
+class FavoritesCheck(Resource):
+    """
+    GET /api/favorites/check?cardIds=1,2,3 -> какие из карточек в избранном
+    Ответ: {"favorites": [1, 3]}
+    """
+
+    @authRequired
+    def get(self):
+        userId = g.userId
+        rawIds = [v.strip() for v in request.args.get('cardIds', '').split(',') if v.strip()]
+        try:
+            # Из query string приходят строки: допускаем только десятичные цифры
+            if not all(v.isdecimal() for v in rawIds):
+                raise ValueError("cardId должны быть целыми числами")
+            cardIds = _parseCardIds([int(v) for v in rawIds])
+        except ValueError as e:
+            return {"message": f"Некорректный список cardId: {e}"}, 400
+
+        favoriteIds = db.FavoritesDB.getFavoriteCardIds(userId, cardIds)
+        if favoriteIds is None:
+            return {"message": "Failed to check favorites"}, 500
+        return {"favorites": favoriteIds}, 200
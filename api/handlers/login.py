@@ -1,10 +1,10 @@
 from flask_restful import Resource, reqparse
 import logging
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 from data.config import jwtSecretKey
 from data import db
+from api.passwords import checkPassword, needsRehash, rehashInBackground, PasswordBusyError
 
 class Login(Resource):
     """
@@ -29,10 +29,18 @@ class Login(Resource):
         if not userRow:
             return {"message": "Неверный логин или пароль"}, 400
 
-        storedHash = userRow['password'].encode('utf-8')
-        if not bcrypt.checkpw(password.encode('utf-8'), storedHash):
+        storedHash = userRow['password']
+        try:
+            passwordOk = checkPassword(password, storedHash)
+        except PasswordBusyError:
+            logging.warning("Очередь проверки паролей переполнена")
+            return {"message": "Сервер перегружен, попробуйте позже"}, 503
+        if not passwordOk:
             return {"message": "Неверный логин или пароль"}, 400
 
+        if needsRehash(storedHash):
+            rehashInBackground(userRow['userId'], password)
+
         # Генерируем JWT
         payload = {
             "userId": userRow['userId'],
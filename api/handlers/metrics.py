@@ -0,0 +1,24 @@
+from flask_restful import Resource
+import os
+from data import db
+from api.auth import adminRequired, getAuthStats
+from api.passwords import getPasswordStats
+
+class Metrics(Resource):
+    """
+    GET /api/admin/metrics – счётчики текущего процесса-воркера (только для adminUserIds)
+      - pool – пул соединений MySQL: checkouts, waits, waitTimeTotal/Max,
+        exhausted, leaked, open/idle/inUse
+      - passwords – пул bcrypt: submitted, inFlight, rejected, timeouts,
+        hashTimeTotal/Max, rounds
+      - auth – кэш проверенных токенов: hits, misses, size, requests, authTimeTotal
+    Каждый воркер считает своё: pid в ответе показывает, какой воркер ответил.
+    """
+    @adminRequired
+    def get(self):
+        return {
+            "pid": os.getpid(),
+            "pool": db.getPoolStats(),
+            "passwords": getPasswordStats(),
+            "auth": getAuthStats()
+        }, 200
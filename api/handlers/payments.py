@@ -1,12 +1,12 @@
 from flask_restful import Resource
-from flask import request, jsonify
+from flask import request, jsonify, g
 import logging
 import time
 import base64
-import jwt
 
-from data.config import jwtSecretKey, merchantId, paymeSecretKey, paymeCheckoutUrl
+from data.config import merchantId, paymeSecretKey, paymeCheckoutUrl
 from data import db
+from api.auth import authRequired
 
 class PaymentsGenerate(Resource):
     """
@@ -19,20 +19,9 @@ class PaymentsGenerate(Resource):
     4) Создаём запись в payments: paymentType='tariff'/'promotion', orderId, amount.
     5) Формируем ссылку PayMe (base64).
     """
+    @authRequired
     def get(self):
-        token = request.headers.get("Authorization")
-        if not token:
-            logging.warning("Токен не предоставлен")
-            return {"message":"Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except Exception as e:
-            logging.warning("Недействительный токен")
-            return {"message":"Invalid token"}, 401
-
-        userId = payload.get("userId")
-        if not userId:
-            return {"message":"Invalid token payload"}, 401
+        userId = g.userId
 
         args = request.args
         cardIdStr = args.get("cardId")
@@ -118,6 +107,9 @@ class PaymeWebhook(Resource):
     Приём PayMe мерчант-запросов: (CheckPerformTransaction, CreateTransaction, PerformTransaction, CancelTransaction, ...).
     При успешном PerformTransaction, если paymentType='tariff' -> обновляем cards.tariffId.
                                 если paymentType='promotion' -> добавляем запись в cardPromotions.
+    Create/Perform/Cancel выполняются одной транзакцией с блокировкой строки платежа;
+    повторы (ретраи Payme) получают сохранённый результат, повторной выдачи нет.
+    Perform/Cancel/CheckTransaction ищут платёж по id транзакции Payme.
     """
     def post(self):
         auth = request.headers.get("Authorization","")
@@ -146,86 +138,50 @@ class PaymeWebhook(Resource):
             return self.rpc_result({"allow": True}, req_id)
 
         elif method == "CreateTransaction":
-            paymentRow = db.PaymentsDB.getPaymentByOrderId(order_id)
-            if not paymentRow:
-                return self.rpc_account_error(-31050, "order_id", "Заказ не найден", req_id)
-            if paymentRow["amount"] != amount:
-                return self.rpc_account_error(-31001, "amount", "Неверная сумма", req_id)
-
-            transactionId = params.get("id")
-            db.PaymentsDB.updatePaymentOnCreateTransaction(order_id, transactionId)
+            paymentRow, error = db.PaymentsDB.createTransaction(order_id, params.get("id"), amount, self.now_ms())
+            if error:
+                return self.rpc_payment_error(error, req_id)
             return self.rpc_result({
-                "create_time": self.now_ms(),
-                "transaction": transactionId,
-                "state": 1
+                "create_time": paymentRow["createTime"],
+                "transaction": paymentRow["transactionId"],
+                "state": paymentRow["state"]
             }, req_id)
 
         elif method == "PerformTransaction":
-            paymentRow = db.PaymentsDB.getPaymentByOrderId(order_id)
-            if not paymentRow:
-                return self.rpc_account_error(-31050, "order_id", "Заказ не найден", req_id)
-            db.PaymentsDB.updatePaymentOnPerform(order_id)
-
-            paymentType = paymentRow["paymentType"]   # 'tariff' or 'promotion'
-            cardId = paymentRow["cardId"]
-            userId = paymentRow["userId"]
-            if paymentType == "tariff":
-                tId = paymentRow["tariffId"]
-                # Ставим карточке tariffId = tId
-                cardInfo = db.Cards.getCardById(cardId)
-                if cardInfo:
-                    db.Cards.updateCardMainFields(
-                        userId=userId,
-                        cardId=cardId,
-                        tariffId=tId,
-                        cardName=cardInfo["cardName"],
-                        description=cardInfo["description"],
-                        address=cardInfo["address"],
-                        locationLat=cardInfo["locationLat"],
-                        locationLng=cardInfo["locationLng"],
-                        website=cardInfo["website"]
-                    )
-                    logging.info(f"[PaymeWebhook] Оплата тарифа (tariffId={tId}) → cardId={cardId}")
-            elif paymentType == "promotion":
-                pId = paymentRow["promotionId"]
-                promoRow = db.PromotionsDB.getPromotionById(pId)
-                if promoRow:
-                    db.PromotionsDB.activatePromotion(
-                        cardId=cardId,
-                        promotionId=pId,
-                        durationDays=promoRow["durationDays"]
-                    )
-                    logging.info(f"[PaymeWebhook] Оплата промо (promotionId={pId}) → cardId={cardId}")
-
+            paymentRow, error = db.PaymentsDB.performTransaction(params.get("id"), self.now_ms())
+            if error:
+                return self.rpc_payment_error(error, req_id)
+            logging.info(f"[PaymeWebhook] Оплата {paymentRow['paymentType']} "
+                         f"(tariffId={paymentRow['tariffId']}, promotionId={paymentRow['promotionId']}) "
+                         f"→ cardId={paymentRow['cardId']}")
             return self.rpc_result({
-                "transaction": params.get("id"),
-                "perform_time": self.now_ms(),
-                "state": 2
+                "transaction": paymentRow["transactionId"],
+                "perform_time": paymentRow["performTime"],
+                "state": paymentRow["state"]
             }, req_id)
 
         elif method == "CancelTransaction":
-            paymentRow = db.PaymentsDB.getPaymentByOrderId(order_id)
-            if not paymentRow:
-                return self.rpc_account_error(-31050, "order_id", "Заказ не найден", req_id)
-            reason = params.get("reason")
-            db.PaymentsDB.updatePaymentOnCancel(order_id, reason)
+            paymentRow, error = db.PaymentsDB.cancelTransaction(params.get("id"), params.get("reason"), self.now_ms())
+            if error:
+                return self.rpc_payment_error(error, req_id)
             return self.rpc_result({
-                "transaction": params.get("id"),
-                "cancel_time": self.now_ms(),
-                "state": -1,
-                "reason": reason
+                "transaction": paymentRow["transactionId"],
+                "cancel_time": paymentRow["cancelTime"],
+                "state": paymentRow["state"],
+                "reason": paymentRow["reason"]
             }, req_id)
 
         elif method == "CheckTransaction":
-            paymentRow = db.PaymentsDB.getPaymentByOrderId(order_id)
-            st = paymentRow["state"] if paymentRow else 0
+            paymentRow = db.PaymentsDB.getPaymentByTransactionId(params.get("id"))
+            if not paymentRow:
+                return self.rpc_payment_error("transactionNotFound", req_id)
             return self.rpc_result({
-                "create_time": self.now_ms(),
-                "perform_time": self.now_ms() if st==2 else 0,
-                "cancel_time": self.now_ms() if st==-1 else 0,
-                "transaction": params.get("id"),
-                "state": st,
-                "reason": paymentRow["reason"] if paymentRow else None
+                "create_time": paymentRow["createTime"] or 0,
+                "perform_time": paymentRow["performTime"] or 0,
+                "cancel_time": paymentRow["cancelTime"] or 0,
+                "transaction": paymentRow["transactionId"],
+                "state": paymentRow["state"],
+                "reason": paymentRow["reason"]
             }, req_id)
 
         elif method == "GetStatement":
@@ -257,5 +213,22 @@ class PaymeWebhook(Resource):
             "id": req_id
         })
 
+    # Коды ошибок PaymentsDB.*Transaction -> ошибки протокола Payme
+    PAYMENT_ERRORS = {
+        "orderNotFound": (-31050, "order_id", "Заказ не найден"),
+        "wrongAmount": (-31001, "amount", "Неверная сумма"),
+        "orderBusy": (-31099, "order_id", "По заказу уже создана другая транзакция"),
+        "transactionNotFound": (-31003, None, "Транзакция не найдена"),
+        "cannotPerform": (-31008, None, "Невозможно выполнить операцию"),
+        "cannotCancel": (-31007, None, "Заказ выполнен, отмена невозможна"),
+        "dbError": (-32400, None, "Системная ошибка")
+    }
+
+    def rpc_payment_error(self, error, req_id):
+        code, field, message = self.PAYMENT_ERRORS[error]
+        if field:
+            return self.rpc_account_error(code, field, message, req_id)
+        return self.rpc_error(code, message, req_id)
+
     def now_ms(self):
         return int(time.time() * 1000)
\ No newline at end of file
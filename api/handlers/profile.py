@@ -1,13 +1,9 @@
 from flask_restful import Resource, reqparse
-from flask import request
+from flask import request, g
 import logging
-import jwt
-import os
-from werkzeug.utils import secure_filename
-from data.config import jwtSecretKey
 from data import db
-
-UPLOAD_FOLDER_PROFILE = './static/uploads/profile/'  # Папка для сохранения аватарок
+from api.auth import authRequired
+from api.images import storeImageUpload, AVATAR_VARIANTS, InvalidImageError
 
 class Profile(Resource):
     """
@@ -21,23 +17,9 @@ class Profile(Resource):
       Если поле не передано, оно сохраняется без изменений.
       Заголовок: Authorization: <token>
     """
+    @authRequired
     def get(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            logging.warning("Токен не предоставлен")
-            return {"message": "Token is missing"}, 401
-
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-            logging.info(f"Payload из токена: {payload}")
-        except jwt.ExpiredSignatureError:
-            return {"message": "Token has expired"}, 401
-        except jwt.InvalidTokenError:
-            return {"message": "Invalid token"}, 401
-
-        userId = payload.get('userId')
-        if not userId:
-            return {"message": "Invalid payload (no userId)"}, 401
+        userId = g.userId
 
         userRow = db.Users.getUserById(userId)
         if not userRow:
@@ -49,23 +31,15 @@ class Profile(Resource):
             "email": userRow['email'],
             "fullName": userRow['fullName'],
             "avatar": userRow['avatar'],
+            "avatarThumb": userRow.get('avatarThumb') or userRow['avatar'],
             "emailConfirmation": userRow.get("emailConfirmation", 0),
             "createdAt": str(userRow['createdAt']),
             "cards": userCards
         }, 200
 
+    @authRequired
     def put(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            return {"message": "Invalid or expired token"}, 401
-
-        userId = payload.get('userId')
-        if not userId:
-            return {"message": "Invalid token payload"}, 401
+        userId = g.userId
 
         # Получаем текущие данные пользователя, чтобы сохранить не обновляемые поля
         userRow = db.Users.getUserById(userId)
@@ -79,22 +53,24 @@ class Profile(Resource):
         # Проверяем, передан ли файл аватара
         avatarFile = request.files.get('avatar')
         avatarUrl = None
+        avatarThumb = None
+        avatarBlobId = None
         if avatarFile:
-            if not os.path.exists(UPLOAD_FOLDER_PROFILE):
-                os.makedirs(UPLOAD_FOLDER_PROFILE, exist_ok=True)
-            filename = secure_filename(avatarFile.filename)
-            # Уникальное имя можно сформировать, например, по userId и timestamp
-            import time
-            uniqueName = f"{userId}_{int(time.time())}_{filename}"
-            filepath = os.path.join(UPLOAD_FOLDER_PROFILE, uniqueName)
-            avatarFile.save(filepath)
-            avatarUrl = f"/uploads/profile/{uniqueName}"
+            # Имя файла – хеш содержимого: повторная загрузка того же фото не занимает места
+            try:
+                urls = storeImageUpload(avatarFile, AVATAR_VARIANTS)
+            except InvalidImageError as e:
+                return {"message": str(e)}, 400
+            avatarUrl = urls["original"]
+            avatarThumb = urls["square"]
+            avatarBlobId = urls["blobId"]
         else:
             # Если файл не передан, сохраняем текущее значение
             avatarUrl = userRow['avatar']
+            avatarThumb = userRow.get('avatarThumb')
 
         # Обновляем профиль в базе
-        updated = db.Users.updateProfile(userId, fullName, avatarUrl)
+        updated = db.Users.updateProfile(userId, fullName, avatarUrl, avatarThumb, avatarBlobId)
         if not updated:
             return {"message": "Ошибка при обновлении профиля"}, 500
 
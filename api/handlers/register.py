@@ -1,66 +1,18 @@
 from flask_restful import Resource, reqparse
 import logging
-import bcrypt
 import random
 import string
 
-from data.config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD
 from data import db
-
-def sendEmailConfirmation(email, code):
-    import smtplib
-    import logging
-    from email.mime.text import MIMEText
-    from email.mime.multipart import MIMEMultipart
-
-    # Настраиваем тело письма (HTML-формат для красоты)
-    message_body = f"""
-    <html>
-    <head>
-        <meta charset="UTF-8">
-    </head>
-    <body style="font-family:Arial, sans-serif; line-height:1.5;">
-        <h2 style="color: #2a7ec5;">Wedday-ga xush kelibsiz!</h2>
-        <p>Biz siz bilan hamkorlik qilishdan xursandmiz.</p>
-        <p>Sizning tasdiqlash kodingiz:</p>
-        <p style="font-size: 1.3em; font-weight:bold;">{code}</p>
-        <p>
-            Iltimos, ushbu kodni veb-saytimizga kiriting va ro‘yxatdan o‘tishni yakunlang.
-            <br>Agar siz ushbu kodni so‘ramagan bo‘lsangiz yoki Wedday-da ro‘yxatdan o‘tmagan bo‘lsangiz, ushbu xabarni e'tiborsiz qoldiring.
-        </p>
-        <br>
-        <p>
-            Hurmat bilan,<br>
-            Wedday jamoasi
-        </p>
-    </body>
-    </html>
-    """
-
-    msg = MIMEMultipart("alternative")
-    msg["From"] = SMTP_USERNAME
-    msg["To"] = email
-    msg["Subject"] = "Tasdiqlash kodingiz - Wedday"
-    msg.attach(MIMEText(message_body, "html"))
-
-    # Подключаемся к SMTP-серверу и отправляем письмо
-    try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.sendmail(SMTP_USERNAME, email, msg.as_string())
-        server.quit()
-        print("Xat muvaffaqiyatli yuborildi!")
-    except Exception as e:
-        print(f"Xat yuborishda xatolik yuz berdi: {e}")
-
-    logging.info(f"Tasdiqlash kodingiz '{code}' elektron pochtangizga yuborildi: {email}")
+from api.mailer import buildConfirmationEmail, notifyOutbox
+from api.passwords import hashPassword, PasswordBusyError
 
 class Register(Resource):
     """
     1) POST /api/register
        JSON: { "email", "fullName", "password" }
-       Создаёт пользователя (emailConfirmation=0), генерирует код и отправляет на почту.
+       Создаёт пользователя (emailConfirmation=0), генерирует код и ставит письмо
+       в очередь emailOutbox (отправляет фоновый воркер api/mailer.py).
 
     2) PUT /api/register
        JSON: { "email", "code" }
@@ -95,23 +47,28 @@ class Register(Resource):
         if not any(ch.isdigit() for ch in password):
             return {"message": "Должна быть хотя бы одна цифра"}, 400
 
-        hashedPassword = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-        # Проверяем, нет ли уже такого email
+        # Проверяем, нет ли уже такого email (до дорогого хеширования)
         existingUser = db.Users.getUserByEmail(email)
         if existingUser:
             return {"message": "Такой email уже зарегистрирован"}, 400
 
+        try:
+            hashedPassword = hashPassword(password)
+        except PasswordBusyError:
+            logging.warning("Очередь хеширования паролей переполнена")
+            return {"message": "Сервер перегружен, попробуйте позже"}, 503
+
         # Генерируем код подтверждения (например, 6 цифр)
         confirmationCode = ''.join(random.choices(string.digits, k=6))
 
-        # Создаём запись
-        userId = db.Users.createUserWithData(email, fullName, hashedPassword, confirmationCode)
+        # Создаём запись и письмо с кодом в одной транзакции
+        userId = db.Users.createUserWithData(email, fullName, hashedPassword, confirmationCode,
+                                             confirmationEmail=buildConfirmationEmail(confirmationCode))
         if not userId:
             return {"message": "Ошибка при создании пользователя"}, 500
 
-        # Отправляем код на почту (заглушка)
-        sendEmailConfirmation(email, confirmationCode)
+        # Письмо отправит фоновый воркер, не задерживая ответ
+        notifyOutbox()
 
         logging.info(f"Создан пользователь userId={userId}, email={email}, emailConfirmation=0")
         return {"message": "Регистрация успешна, код отправлен на почту", "userId": userId}, 201
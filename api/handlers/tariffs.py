@@ -1,9 +1,8 @@
 from flask_restful import Resource, reqparse
 import logging
 from flask import request
-import jwt
-from data.config import jwtSecretKey
 from data import db
+from api.auth import authRequired
 
 class Tariffs(Resource):
     """
@@ -13,17 +12,8 @@ class Tariffs(Resource):
     DELETE /api/tariffs -> Удалить тариф
     """
 
+    @authRequired
     def get(self):
-        # Можно проверять авторизацию, если хотите. Пример:
-        token = request.headers.get('Authorization')
-        if not token:
-            logging.warning("Токен не предоставлен")
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except:
-            return {"message": "Invalid token"}, 401
-
         tariffs = db.TariffsDB.getAllTariffs()
         result = []
         for row in tariffs:
@@ -33,16 +23,8 @@ class Tariffs(Resource):
 
         return result, 200
 
+    @authRequired
     def post(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            logging.warning("Токен не предоставлен")
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except:
-            return {"message": "Invalid token"}, 401
-
         data = request.get_json()
         if not data:
             return {"message": "No input data"}, 400
@@ -64,15 +46,8 @@ class Tariffs(Resource):
         logging.info(f"Создан тариф {tariffName} (tariffId={tariffId})")
         return {"message":"Tariff created","tariffId":tariffId}, 201
 
+    @authRequired
     def put(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message": "Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except:
-            return {"message": "Invalid token"}, 401
-
         data = request.get_json()
         if not data:
             return {"message":"No input data"}, 400
@@ -107,15 +82,8 @@ class Tariffs(Resource):
         logging.info(f"Обновлён тариф (tariffId={tariffId})")
         return {"message":"Tariff updated"}, 200
 
+    @authRequired
     def delete(self):
-        token = request.headers.get('Authorization')
-        if not token:
-            return {"message":"Token is missing"}, 401
-        try:
-            payload = jwt.decode(token, jwtSecretKey, algorithms=["HS256"])
-        except:
-            return {"message":"Invalid token"}, 401
-
         data = request.get_json()
         if not data:
             return {"message":"No input data"}, 400
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from PIL import Image, ImageOps
+from data.config import uploadRoot
+
+# Защита от «бомб» распаковки: ~50 Мп хватает любой камере телефона
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+# Производные размеры: (ширина, высота, квадратная обрезка)
+DERIVATIVES = {
+    "thumb": (400, 400, False),     # списки карточек
+    "detail": (1280, 1280, False),  # страница карточки
+    "square": (256, 256, True),     # аватар, логотип категории
+}
+CARD_PHOTO_VARIANTS = ("thumb", "detail")
+AVATAR_VARIANTS = ("square",)
+
+WEBP_QUALITY = 80
+
+# Принимаемые форматы и расширение оригинала: по содержимому (Pillow),
+# а не по имени файла от клиента – иначе .html/.svg/.js отдавались бы с нашего домена
+IMAGE_FORMATS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+
+class InvalidImageError(ValueError):
+    """Загруженный файл не является изображением поддерживаемого формата."""
+
+# Контентно-адресуемое хранилище: файл называется sha256 своего содержимого
+BLOB_ROOT = os.path.join(uploadRoot, 'blobs')
+BLOB_URL_PREFIX = '/uploads/blobs'
+CHUNK_SIZE = 64 * 1024
+
+
+def makeDerivatives(sourcePath, variants):
+    """
+    Создаёт уменьшенные копии изображения рядом с оригиналом:
+    <имя>.<вариант>.webp. Копии перекодируются в WebP без EXIF
+    (ориентация из EXIF применяется до удаления).
+    Возвращает {вариант: путь к файлу}; пустой словарь, если файл не изображение.
+    """
+    stem = os.path.splitext(sourcePath)[0]
+    result = {}
+    try:
+        with Image.open(sourcePath) as img:
+            # Для JPEG декодируем сразу в уменьшенном масштабе – в разы быстрее
+            maxW = max(DERIVATIVES[v][0] for v in variants)
+            maxH = max(DERIVATIVES[v][1] for v in variants)
+            img.draft('RGB', (maxW, maxH))
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+
+            for variant in variants:
+                width, height, square = DERIVATIVES[variant]
+                if square:
+                    out = ImageOps.fit(img, (width, height), Image.LANCZOS)
+                else:
+                    out = img.copy()
+                    out.thumbnail((width, height), Image.LANCZOS)
+                path = f"{stem}.{variant}.webp"
+                # Пишем во временный файл и атомарно переименовываем:
+                # параллельная загрузка того же файла не увидит недописанное превью
+                tmpPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                out.save(tmpPath, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.replace(tmpPath, path)
+                result[variant] = path
+    except (OSError, Image.DecompressionBombError) as e:
+        logging.warning(f"Не удалось создать превью для {sourcePath}: {e}")
+        return {}
+    return result
+
+def _detectExtension(path):
+    """Расширение по формату, который определил Pillow; InvalidImageError для прочих файлов."""
+    try:
+        with Image.open(path) as img:
+            fmt = img.format
+    except (OSError, Image.DecompressionBombError):
+        fmt = None
+    if fmt not in IMAGE_FORMATS:
+        raise InvalidImageError("Файл должен быть изображением JPEG, PNG, WebP или GIF")
+    return IMAGE_FORMATS[fmt]
+
+def blobPath(blobId, suffix):
+    """Путь файла в хранилище: blobs/<первые 2 символа>/<sha256><suffix>."""
+    return os.path.join(BLOB_ROOT, blobId[:2], f"{blobId}{suffix}")
+
+def blobUrl(blobId, suffix):
+    return f"{BLOB_URL_PREFIX}/{blobId[:2]}/{blobId}{suffix}"
+
+def storeImageUpload(fileStorage, variants):
+    """
+    Сохраняет загруженный файл в контентно-адресуемое хранилище.
+    sha256 считается потоково во время записи во временный файл; если такой
+    блоб уже есть, временный файл удаляется – повторная загрузка не занимает
+    места и не пересчитывает превью. Имя файла зависит только от содержимого,
+    поэтому ссылки стабильны и кэшируются навсегда.
+    Расширение оригинала берётся из формата файла, не из имени: одинаковые
+    байты всегда дают один и тот же файл. Не изображение – InvalidImageError.
+    Возвращает {"blobId": sha256, "original": url, <вариант>: url, ...}.
+    """
+    tmpDir = os.path.join(BLOB_ROOT, 'tmp')
+    os.makedirs(tmpDir, exist_ok=True)
+    tmpPath = os.path.join(tmpDir, uuid.uuid4().hex)
+
+    digest = hashlib.sha256()
+    try:
+        with open(tmpPath, 'wb') as out:
+            while True:
+                chunk = fileStorage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        ext = _detectExtension(tmpPath)
+        blobId = digest.hexdigest()
+        path = blobPath(blobId, ext)
+        if os.path.exists(path):
+            os.remove(tmpPath)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmpPath, path)
+    except Exception:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+    missing = [v for v in variants if not os.path.exists(blobPath(blobId, f".{v}.webp"))]
+    created = makeDerivatives(path, missing) if missing else {}
+
+    urls = {"blobId": blobId, "original": blobUrl(blobId, ext)}
+    for variant in variants:
+        if variant in created or variant not in missing:
+            urls[variant] = blobUrl(blobId, f".{variant}.webp")
+        else:
+            urls[variant] = urls["original"]
+    return urls
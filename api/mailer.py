@@ -0,0 +1,181 @@
+import logging
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from data.config import (
+    SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SMTP_STARTTLS, SMTP_TIMEOUT,
+    outboxBatchSize, outboxPollInterval, outboxMaxAttempts, outboxSessionIdle
+)
+from data import db
+
+# Худший случай на одно письмо: переподключение (connect, STARTTLS, login) и sendmail,
+# каждый шаг ограничен SMTP_TIMEOUT
+MESSAGE_TIME_BUDGET = SMTP_TIMEOUT * 4
+# Аренда пачки на время отправки: если воркер упал, письма снова станут доступными.
+# Длиннее худшего времени отправки всей пачки, иначе воркер другого процесса
+# заберёт письма повторно, пока эта пачка ещё отправляется
+LEASE_SECONDS = max(300, int(outboxBatchSize * MESSAGE_TIME_BUDGET) + 60)
+# Повторы: 30 сек, 1 мин, 2 мин, ... но не реже раза в час
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def buildConfirmationEmail(code):
+    """Тема и HTML письма с кодом подтверждения."""
+    body = f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+    </head>
+    <body style="font-family:Arial, sans-serif; line-height:1.5;">
+        <h2 style="color: #2a7ec5;">Wedday-ga xush kelibsiz!</h2>
+        <p>Biz siz bilan hamkorlik qilishdan xursandmiz.</p>
+        <p>Sizning tasdiqlash kodingiz:</p>
+        <p style="font-size: 1.3em; font-weight:bold;">{code}</p>
+        <p>
+            Iltimos, ushbu kodni veb-saytimizga kiriting va ro‘yxatdan o‘tishni yakunlang.
+            <br>Agar siz ushbu kodni so‘ramagan bo‘lsangiz yoki Wedday-da ro‘yxatdan o‘tmagan bo‘lsangiz, ushbu xabarni e'tiborsiz qoldiring.
+        </p>
+        <br>
+        <p>
+            Hurmat bilan,<br>
+            Wedday jamoasi
+        </p>
+    </body>
+    </html>
+    """
+    return "Tasdiqlash kodingiz - Wedday", body
+
+def retryDelay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой; None – попытки исчерпаны."""
+    if attempts + 1 >= outboxMaxAttempts:
+        return None
+    return min(RETRY_BASE_SECONDS * (2 ** attempts), RETRY_MAX_SECONDS)
+
+
+class OutboxWorker(threading.Thread):
+    """
+    Фоновый отправитель писем из emailOutbox.
+    Забирает письма пачками, отправляет их через одну авторизованную
+    SMTP-сессию (сессия переиспользуется между пачками и закрывается после
+    outboxSessionIdle секунд простоя), неудачные письма повторяет с backoff.
+    """
+    def __init__(self):
+        super().__init__(name="OutboxWorker", daemon=True)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._server = None
+        self._lastSendAt = 0.0
+
+    def notify(self):
+        """Разбудить воркер сразу (например, после регистрации)."""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run(self):
+        logging.info("OutboxWorker запущен")
+        while not self._stopping.is_set():
+            try:
+                sent = self.processBatch()
+            except Exception as e:
+                logging.error(f"OutboxWorker: ошибка обработки очереди: {e}")
+                self._closeSession()
+                sent = 0
+            if sent < outboxBatchSize:
+                # Очередь разобрана – ждём новых писем или следующего опроса
+                if self._server and time.monotonic() - self._lastSendAt > outboxSessionIdle:
+                    self._closeSession()
+                self._wakeup.wait(outboxPollInterval)
+                self._wakeup.clear()
+        self._closeSession()
+
+    def processBatch(self):
+        """Отправляет одну пачку. Возвращает число взятых из очереди писем."""
+        rows = db.EmailOutboxDB.claimBatch(outboxBatchSize, LEASE_SECONDS)
+        leaseDeadline = time.monotonic() + LEASE_SECONDS - MESSAGE_TIME_BUDGET
+        sent = 0
+        for index, row in enumerate(rows):
+            if time.monotonic() > leaseDeadline:
+                # Аренда вот-вот истечёт: остаток возвращаем в очередь, а не рискуем дублем
+                rest = [r["outboxId"] for r in rows[index:]]
+                logging.warning(f"OutboxWorker: аренда пачки истекает, возвращено в очередь: {len(rest)}")
+                db.EmailOutboxDB.releaseLease(rest)
+                break
+            try:
+                self._send(row)
+            except Exception as e:
+                logging.warning(f"OutboxWorker: письмо outboxId={row['outboxId']} не отправлено: {e}")
+                db.EmailOutboxDB.markFailed(row["outboxId"], e, retryDelay(row["attempts"]))
+                continue
+            # Сразу после доставки: сбой на следующих письмах не должен вернуть это в очередь
+            db.EmailOutboxDB.markSent([row["outboxId"]])
+            sent += 1
+        if sent:
+            logging.info(f"OutboxWorker: отправлено писем: {sent}")
+        return len(rows)
+
+    def _send(self, row):
+        msg = MIMEMultipart("alternative")
+        msg["From"] = SMTP_USERNAME
+        msg["To"] = row["recipient"]
+        msg["Subject"] = row["subject"]
+        msg.attach(MIMEText(row["body"], "html"))
+        try:
+            self._session().sendmail(SMTP_USERNAME, row["recipient"], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # Сервер закрыл простаивающую сессию – переподключаемся один раз
+            self._closeSession()
+            self._session().sendmail(SMTP_USERNAME, row["recipient"], msg.as_string())
+        self._lastSendAt = time.monotonic()
+
+    def _session(self):
+        if self._server is None:
+            server = smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT), timeout=SMTP_TIMEOUT)
+            if SMTP_STARTTLS:
+                server.starttls()
+            if SMTP_USERNAME and SMTP_PASSWORD:
+                server.login(SMTP_USERNAME, SMTP_PASSWORD)
+            self._server = server
+        return self._server
+
+    def _closeSession(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            pass
+        self._server = None
+
+
+_worker = None
+_workerLock = threading.Lock()
+
+def startOutboxWorker():
+    """Запускает фоновый воркер в текущем процессе (один на процесс)."""
+    global _worker
+    with _workerLock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker()
+            _worker.start()
+    return _worker
+
+def notifyOutbox():
+    """Сообщить воркеру о новом письме; без запущенного воркера письмо уйдёт при следующем опросе."""
+    if _worker is not None:
+        _worker.notify()
+
+
+if __name__ == '__main__':
+    # Отдельный процесс-отправитель: python -m api.mailer
+    worker = OutboxWorker()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
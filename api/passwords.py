@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+
+from data.config import bcryptRounds, passwordWorkers, passwordQueueLimit, passwordTimeout
+from data import db
+
+
+class PasswordBusyError(Exception):
+    """Очередь хеширования переполнена или ответ не получен за passwordTimeout."""
+
+
+class PasswordHasher:
+    """
+    Отдельный ограниченный пул для bcrypt.
+    bcrypt отпускает GIL, поэтому потоки считают хеши параллельно, но их
+    не больше passwordWorkers, а в очереди – не больше passwordQueueLimit задач.
+    При всплеске логинов лишние запросы сразу получают отказ (503),
+    а не занимают воркеры, обслуживающие каталог.
+    """
+    def __init__(self, workers, queueLimit, timeout, rounds):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queueLimit)
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "inFlight": 0,
+            "hashTimeTotal": 0.0,
+            "hashTimeMax": 0.0,
+        }
+
+    def _run(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats["inFlight"] -= 1
+                self._stats["hashTimeTotal"] += elapsed
+                self._stats["hashTimeMax"] = max(self._stats["hashTimeMax"], elapsed)
+            self._slots.release()
+
+    def submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise PasswordBusyError("Очередь хеширования паролей переполнена")
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["inFlight"] += 1
+        return self._executor.submit(self._run, func, *args)
+
+    def call(self, func, *args):
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PasswordBusyError("Превышено время ожидания хеширования пароля")
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+        result["rounds"] = self.rounds
+        return result
+
+
+hasher = PasswordHasher(passwordWorkers, passwordQueueLimit, passwordTimeout, bcryptRounds)
+
+def getPasswordStats():
+    """Счётчики пула bcrypt: очередь (inFlight), отказы, время хеширования."""
+    return hasher.stats()
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=hasher.rounds)).decode('utf-8')
+
+def _check(password, storedHash):
+    return bcrypt.checkpw(password.encode('utf-8'), storedHash.encode('utf-8'))
+
+def hashPassword(password):
+    """Хеш пароля с текущим bcryptRounds. PasswordBusyError при перегрузке."""
+    return hasher.call(_hash, password)
+
+def checkPassword(password, storedHash):
+    """Проверка пароля. PasswordBusyError при перегрузке."""
+    return hasher.call(_check, password, storedHash)
+
+def needsRehash(storedHash):
+    """True, если хеш посчитан с другой стоимостью, чем bcryptRounds ($2b$<cost>$...)."""
+    try:
+        return int(storedHash.split('$')[2]) != hasher.rounds
+    except (IndexError, ValueError):
+        return False
+
+def rehashInBackground(userId, password):
+    """
+    Пересчитывает хеш с новой стоимостью после успешного входа, не задерживая ответ.
+    Если пул занят – пропускаем, перехешируем при следующем входе.
+    """
+    def rehash():
+        newHash = _hash(password)
+        if db.Users.updatePasswordHash(userId, newHash):
+            logging.info(f"Пароль userId={userId} перехеширован (rounds={hasher.rounds})")
+    try:
+        hasher.submit(rehash)
+    except PasswordBusyError:
+        pass
@@ -0,0 +1,77 @@
+import os
+import mimetypes
+from flask import request, send_file, abort, Response
+from werkzeug.security import safe_join
+
+from data.config import uploadRoot, staticOffload, staticAccelPrefix
+
+# Корень загрузок: сюда пишут обработчики (static/uploads/...), URL – /uploads/<path>
+UPLOAD_ROOT = os.path.abspath(uploadRoot)
+BLOB_DIR = 'blobs'
+
+# Файлы хранилища блобов называются sha256 содержимого и никогда не меняются
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Старые загрузки (имя не зависит от содержимого) – кэш с перепроверкой
+LEGACY_MAX_AGE = 24 * 3600
+
+
+def _resolve(filename):
+    path = safe_join(UPLOAD_ROOT, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+def _blobEtag(filename):
+    """Для блобов ETag – sha256 из имени файла (до первой точки)."""
+    parts = filename.split('/')
+    if len(parts) >= 3 and parts[0] == BLOB_DIR:
+        return os.path.basename(filename).split('.', 1)[0]
+    return None
+
+def serveUpload(filename):
+    """
+    GET /uploads/<path>
+    Отдаёт загруженные файлы из UPLOAD_ROOT:
+      - блобы (uploads/blobs/...) – Cache-Control: immutable на год, ETag = sha256;
+      - прочие файлы – кэш на сутки с ETag по mtime/размеру;
+      - If-None-Match / If-Modified-Since -> 304, Range -> 206 (werkzeug);
+      - staticOffload='x-accel' | 'x-sendfile' – байты отдаёт прокси (nginx /
+        apache), воркер Python только формирует заголовки;
+      - всегда X-Content-Type-Options: nosniff; не-изображения – только как attachment.
+    """
+    path = _resolve(filename)
+    if path is None:
+        abort(404)
+
+    # Всё, что не растровая картинка (например, старые загрузки .html/.svg),
+    # отдаём только на скачивание, чтобы браузер не исполнил его с нашего домена
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    inline = mimetype.startswith('image/') and mimetype != 'image/svg+xml'
+    if not inline:
+        mimetype = 'application/octet-stream'
+
+    etag = _blobEtag(filename)
+    if etag:
+        cacheControl = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        stat = os.stat(path)
+        etag = f"{int(stat.st_mtime)}-{stat.st_size}"
+        cacheControl = f"public, max-age={LEGACY_MAX_AGE}"
+
+    if staticOffload == 'x-accel':
+        # nginx: location {staticAccelPrefix}/ { internal; alias <UPLOAD_ROOT>/; }
+        # Range и условные запросы nginx обрабатывает сам
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = f"{staticAccelPrefix}/{filename}"
+    else:
+        # 'x-sendfile' включается через USE_X_SENDFILE в createApp()
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cacheControl
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if not inline:
+        response.headers['Content-Disposition'] = 'attachment'
+    return response
@@ -8,15 +8,65 @@ mysqlUser = os.getenv("mysqlUser")
 mysqlPassword = os.getenv("mysqlPassword")
 mysqlDatabase = os.getenv("mysqlDatabase")
 
+# Пул соединений MySQL (на каждый процесс-воркер)
+mysqlPoolSize = int(os.getenv("mysqlPoolSize", 5))
+mysqlPoolMaxOverflow = int(os.getenv("mysqlPoolMaxOverflow", 10))
+mysqlPoolRecycle = int(os.getenv("mysqlPoolRecycle", 1800))   # сек. простоя до пересоздания
+mysqlPoolTimeout = float(os.getenv("mysqlPoolTimeout", 10))   # сек. ожидания свободного соединения
+mysqlPoolPrePing = os.getenv("mysqlPoolPrePing", "1") == "1"
+
+# Кэш справочников (категории, тарифы): как часто сверять версию с БД, сек.
+referenceCacheTtl = float(os.getenv("referenceCacheTtl", 30))
+# Кэш ответа /api/categories/with_cards: как часто сверять версию каталога, сек.
+catalogCacheTtl = float(os.getenv("catalogCacheTtl", 5))
+# Каталог (любой sort): счётчики избранного не сбрасывают кэш, пересборка не реже, сек.
+popularCatalogMaxAge = float(os.getenv("popularCatalogMaxAge", 60))
+
 ip = os.getenv("ip")
 port = os.getenv("port")
 
+# Загрузки: корень на диске и отдача файлов
+uploadRoot = os.getenv("uploadRoot", "./static/uploads")
+# '' – файлы отдаёт Flask; 'x-accel' – nginx (X-Accel-Redirect); 'x-sendfile' – apache/lighttpd
+staticOffload = os.getenv("staticOffload", "")
+staticAccelPrefix = os.getenv("staticAccelPrefix", "/protected-uploads")
+
+# Production-сервер (serve.py, gunicorn)
+serverWorkers = int(os.getenv("serverWorkers", (os.cpu_count() or 1) * 2 + 1))
+serverThreads = int(os.getenv("serverThreads", 4))
+serverTimeout = int(os.getenv("serverTimeout", 30))
+serverGracefulTimeout = int(os.getenv("serverGracefulTimeout", 30))
+serverKeepAlive = int(os.getenv("serverKeepAlive", 5))
+serverMaxRequests = int(os.getenv("serverMaxRequests", 10000))
+
 jwtSecretKey = os.getenv('jwtSecretKey')
+# userId администраторов через запятую (доступ к /api/admin/...)
+adminUserIds = {int(x) for x in os.getenv('adminUserIds', '').split(',') if x.strip()}
+# Сколько проверенных токенов держать в LRU-кэше на процесс
+authCacheSize = int(os.getenv('authCacheSize', 10000))
+
+# bcrypt: стоимость хеша и отдельный ограниченный пул потоков
+bcryptRounds = int(os.getenv('bcryptRounds', 12))
+passwordWorkers = int(os.getenv('passwordWorkers', 2))
+passwordQueueLimit = int(os.getenv('passwordQueueLimit', 32))
+passwordTimeout = float(os.getenv('passwordTimeout', 10))
 
 SMTP_SERVER = os.getenv('SMTP_SERVER')
 SMTP_PORT = os.getenv("SMTP_PORT")
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# 0 – без STARTTLS (например, локальный тестовый SMTP: python -m smtpd / aiosmtpd)
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+
+# Фоновая отправка писем из emailOutbox
+outboxBatchSize = int(os.getenv("outboxBatchSize", 20))
+outboxPollInterval = float(os.getenv("outboxPollInterval", 5))
+outboxMaxAttempts = int(os.getenv("outboxMaxAttempts", 8))
+outboxSessionIdle = float(os.getenv("outboxSessionIdle", 60))  # сек. держать SMTP-сессию без писем
+
+# Массовый импорт карточек: сколько записей в одной транзакции
+importChunkSize = int(os.getenv("importChunkSize", 200))
 
 merchantId = os.getenv("merchantId")
 paymeSecretKey = os.getenv("secretKey")
@@ -1,174 +1,514 @@
 import mysql.connector
 from mysql.connector import Error, IntegrityError, DataError, DatabaseError, OperationalError
-from data.config import mysqlHost, mysqlUser, mysqlPassword, mysqlDatabase
+from data.config import (
+    mysqlHost, mysqlUser, mysqlPassword, mysqlDatabase,
+    mysqlPoolSize, mysqlPoolMaxOverflow, mysqlPoolRecycle, mysqlPoolTimeout, mysqlPoolPrePing,
+    referenceCacheTtl
+)
 import logging
+import os
+import json
+import math
+import base64
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime
+
+# -------------------- Пул соединений -------------------- #
+class PoolExhaustedError(Exception):
+    """Нет свободного соединения за mysqlPoolTimeout секунд."""
+
+
+class _PoolEntry:
+    __slots__ = ("raw", "createdAt", "lastUsedAt")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.createdAt = time.monotonic()
+        self.lastUsedAt = self.createdAt
+
+
+class PooledConnection:
+    """
+    Обёртка над соединением из пула.
+    Ведёт себя как обычное соединение mysql.connector, но close()
+    возвращает соединение в пул вместо разрыва. Поддерживает with.
+    Если обёртку потеряли, не закрыв, сборщик мусора закрывает соединение
+    и освобождает место в пуле (weakref.finalize), чтобы пул не «вытекал».
+    """
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._finalizer = weakref.finalize(self, pool.reclaim, entry)
+        self._finalizer.atexit = False
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise OperationalError("Соединение уже возвращено в пул")
+        return getattr(self._entry.raw, name)
+
+    def close(self):
+        if self._entry is None:
+            return
+        entry, self._entry = self._entry, None
+        self._finalizer.detach()
+        self._pool.release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений MySQL:
+      - size: сколько соединений держим открытыми постоянно;
+      - maxOverflow: сколько можно открыть сверх size при пиковой нагрузке
+        (лишние закрываются при возврате);
+      - recycle: соединение, простоявшее дольше recycle секунд, пересоздаётся
+        (защита от wait_timeout на стороне MySQL);
+      - timeout: сколько ждать свободного соединения, после чего PoolExhaustedError;
+      - prePing: проверять соединение (ping) перед выдачей.
+    Пул привязан к процессу: после fork воркер открывает свои соединения.
+    """
+    def __init__(self, size=5, maxOverflow=10, recycle=1800, timeout=10.0, prePing=True, **connectArgs):
+        self.size = size
+        self.maxOverflow = maxOverflow
+        self.recycle = recycle
+        self.timeout = timeout
+        self.prePing = prePing
+        self._connectArgs = connectArgs
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._total = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "waitTimeTotal": 0.0,
+            "waitTimeMax": 0.0,
+            "exhausted": 0,
+            "created": 0,
+            "recycled": 0,
+            "pingFailures": 0,
+            "leaked": 0,
+        }
+
+    def _open(self):
+        entry = _PoolEntry(mysql.connector.connect(**self._connectArgs))
+        with self._cond:
+            self._stats["created"] += 1
+        return entry
+
+    @staticmethod
+    def _closeRaw(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        waited = False
+        entry = None
+        with self._cond:
+            if self._pid != os.getpid():
+                # Мы в дочернем процессе: сокеты родителя не трогаем
+                self._reset()
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()  # LIFO: отдаём самое «тёплое» соединение
+                    break
+                if self._total < self.size + self.maxOverflow:
+                    self._total += 1
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["exhausted"] += 1
+                    raise PoolExhaustedError(
+                        f"Пул исчерпан: {self._total} соединений заняты дольше {self.timeout} сек."
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            waitTime = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["waitTimeTotal"] += waitTime
+                self._stats["waitTimeMax"] = max(self._stats["waitTimeMax"], waitTime)
+
+        try:
+            entry = self._validate(entry)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def _validate(self, entry):
+        """Возвращает рабочее соединение: новое, пересозданное или проверенное ping."""
+        if entry is None:
+            return self._open()
+        if self.recycle and time.monotonic() - entry.lastUsedAt > self.recycle:
+            self._closeRaw(entry.raw)
+            with self._cond:
+                self._stats["recycled"] += 1
+            return self._open()
+        if self.prePing:
+            try:
+                entry.raw.ping(reconnect=False)
+            except Exception:
+                self._closeRaw(entry.raw)
+                with self._cond:
+                    self._stats["pingFailures"] += 1
+                return self._open()
+        return entry
+
+    def release(self, entry):
+        if self._pid != os.getpid():
+            return
+        keep = True
+        try:
+            # Закрываем незавершённую транзакцию (в т.ч. снапшот после SELECT),
+            # иначе следующий владелец увидит устаревшие данные.
+            if entry.raw.in_transaction:
+                entry.raw.rollback()
+        except Exception:
+            keep = False
+        entry.lastUsedAt = time.monotonic()
+        with self._cond:
+            if keep and len(self._idle) < self.size:
+                self._idle.append(entry)
+            else:
+                keep = False
+                self._total -= 1
+            self._cond.notify()
+        if not keep:
+            self._closeRaw(entry.raw)
+
+    def reclaim(self, entry):
+        """
+        Соединение не вернули через close() (обёртку собрал GC): состояние
+        соединения неизвестно, поэтому закрываем его и освобождаем место.
+        """
+        if self._pid != os.getpid():
+            return
+        self._closeRaw(entry.raw)
+        with self._cond:
+            self._total -= 1
+            self._stats["leaked"] += 1
+            self._cond.notify()
+        logging.warning("Соединение из пула не было закрыто, место в пуле освобождено")
+
+    def dispose(self):
+        """Закрывает все простаивающие соединения (например, перед fork)."""
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+            self._total -= len(idle)
+        for entry in idle:
+            self._closeRaw(entry.raw)
+
+    def stats(self):
+        with self._cond:
+            result = dict(self._stats)
+            result.update({
+                "size": self.size,
+                "maxOverflow": self.maxOverflow,
+                "open": self._total,
+                "idle": len(self._idle),
+                "inUse": self._total - len(self._idle),
+            })
+        return result
+
+
+_pool = None
+_poolLock = threading.Lock()
+
+def getPool():
+    global _pool
+    if _pool is None:
+        with _poolLock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=mysqlPoolSize,
+                    maxOverflow=mysqlPoolMaxOverflow,
+                    recycle=mysqlPoolRecycle,
+                    timeout=mysqlPoolTimeout,
+                    prePing=mysqlPoolPrePing,
+                    host=mysqlHost,
+                    user=mysqlUser,
+                    password=mysqlPassword,
+                    database=mysqlDatabase
+                )
+    return _pool
+
+def getPoolStats():
+    """Счётчики пула: checkouts, waits, waitTimeTotal/Max, exhausted, open/idle/inUse и т.д."""
+    return getPool().stats()
 
 def connect():
     try:
-        conn = mysql.connector.connect(
-            host=mysqlHost,
-            user=mysqlUser,
-            password=mysqlPassword,
-            database=mysqlDatabase
-        )
-        return conn
+        return getPool().acquire()
     except Exception as error:
         logging.error(f"Ошибка подключения к базе данных: {error}")
         return None
 
+# -------------------- Кэш справочников -------------------- #
+def readCacheVersion(name):
+    """Версия справочника из cacheVersions (поиск по PK); None, если прочитать не удалось."""
+    conn = connect()
+    if not conn:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT version FROM cacheVersions WHERE name=%s", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        logging.error(f"Ошибка readCacheVersion({name}): {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+def bumpCacheVersion(cursor, *names):
+    """
+    Увеличивает версии кэшей names. Вызывается в той же транзакции, что и
+    изменение данных, чтобы другие процессы увидели новую версию вместе с ними.
+    """
+    for name in names:
+        cursor.execute("""
+            INSERT INTO cacheVersions (name, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """, (name,))
+
+_cachesByName = {}
+
+def invalidateCaches(*names):
+    """Сбрасывает кэши names в текущем процессе (после commit изменения)."""
+    for name in names:
+        for cache in _cachesByName.get(name, []):
+            cache.invalidateLocal()
+
+
+class ReferenceCache:
+    """
+    Процессный кэш маленькой, редко меняющейся таблицы.
+    В течение ttl секунд данные отдаются из памяти без обращения к БД.
+    По истечении ttl сверяется только версия из cacheVersions (один PK-запрос):
+    если другой процесс ничего не менял – данные продлеваются без перезагрузки.
+    Запись в этом процессе сбрасывает кэш сразу (invalidateCaches).
+    maxAge – для данных, которые меняются без смены версии (например, счётчики):
+    не старше maxAge секунд, даже если версия та же.
+    loader должен вернуть None при ошибке – тогда результат не кэшируется.
+    """
+    def __init__(self, name, loader, ttl, maxAge=None):
+        self.name = name
+        self._loader = loader
+        self.ttl = ttl
+        self.maxAge = maxAge
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checkAt = 0.0
+        self._loadedAt = 0.0
+        _cachesByName.setdefault(name, []).append(self)
+
+    def get(self):
+        with self._lock:
+            if self._data is not None and time.monotonic() < self._checkAt:
+                return self._data
+
+        # Версию читаем до загрузки: если запись произойдёт между ними,
+        # следующая проверка увидит новую версию и перезагрузит данные
+        version = readCacheVersion(self.name)
+        with self._lock:
+            fresh = self.maxAge is None or time.monotonic() - self._loadedAt < self.maxAge
+            if self._data is not None and version is not None and version == self._version and fresh:
+                self._checkAt = time.monotonic() + self.ttl
+                return self._data
+
+        data = self._loader()
+        if data is None:
+            return None
+        with self._lock:
+            self._data = data
+            self._version = version
+            self._loadedAt = time.monotonic()
+            self._checkAt = self._loadedAt + self.ttl
+        return data
+
+    def invalidateLocal(self):
+        with self._lock:
+            self._data = None
+            self._version = None
+            self._checkAt = 0.0
+
+# -------------------- Курсорная пагинация -------------------- #
+def encodeCursor(*values):
+    """
+    Упаковывает ключ последней строки страницы (например, createdAt, cardId)
+    в непрозрачную для клиента строку.
+    """
+    raw = json.dumps([str(v) if not isinstance(v, (int, float)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decodeCursor(token, size):
+    """
+    Обратное к encodeCursor. Возвращает список из size значений.
+    При повреждённом курсоре бросает ValueError.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Некорректный cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Некорректный cursor")
+    return values
+
+def cursorDatetime(value):
+    """Значение курсора как datetime (ключ createdAt); ValueError, если это не дата."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Некорректный cursor")
+
+def cursorInt(value):
+    """Значение курсора как int (cardId, favoriteCount); ValueError, если это не число."""
+    if isinstance(value, bool):
+        raise ValueError("Некорректный cursor")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Некорректный cursor")
+
+def cursorFloat(value):
+    """Значение курсора как конечный float (score поиска); ValueError, если это не число или NaN/inf."""
+    if isinstance(value, bool):
+        raise ValueError("Некорректный cursor")
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("Некорректный cursor")
+    if not math.isfinite(result):
+        raise ValueError("Некорректный cursor")
+    return result
+
+# -------------------- Миграции схемы -------------------- #
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATIONS_LOCK = 'weddayMigrations'
+
+# Ошибки, означающие, что изменение уже есть в базе (схема создана до появления
+# миграций): таблица существует, дубликат колонки, дубликат индекса
+_ALREADY_APPLIED_ERRNOS = {1050, 1060, 1061}
+
+def _splitStatements(sql):
+    """Делит SQL-файл на отдельные команды по ';' в конце строки, пропуская комментарии."""
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('--'):
+            continue
+        current.append(line)
+        if stripped.endswith(';'):
+            statements.append("\n".join(current).rstrip().rstrip(';'))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+def loadMigrations():
+    """
+    Читает data/migrations/NNNN_<name>.sql.
+    Возвращает список (version, fileName, [statements]) по возрастанию version.
+    """
+    migrations = []
+    for fileName in os.listdir(MIGRATIONS_DIR):
+        if not fileName.endswith('.sql'):
+            continue
+        version = int(fileName.split('_', 1)[0])
+        with open(os.path.join(MIGRATIONS_DIR, fileName), encoding='utf-8') as f:
+            migrations.append((version, fileName, _splitStatements(f.read())))
+    migrations.sort(key=lambda m: m[0])
+    return migrations
+
+def _getSchemaVersion(cursor):
+    """Текущая версия схемы; None, если таблицы schema_version ещё нет."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except DatabaseError as e:
+        if e.errno == 1146:  # ER_NO_SUCH_TABLE
+            return None
+        raise
+    row = cursor.fetchone()
+    return row[0] or 0
+
 def initDB():
+    """
+    Приводит схему БД к актуальной версии: по порядку применяет ещё не
+    применённые миграции и записывает каждую в schema_version.
+    Если схема уже актуальна, выполняется один SELECT и никакого DDL.
+    Параллельный запуск нескольких воркеров сериализуется через GET_LOCK.
+    """
+    migrations = loadMigrations()
+    latest = migrations[-1][0] if migrations else 0
+
     conn = connect()
     if not conn:
         logging.error("Не удалось подключиться к базе для инициализации.")
         return
     cursor = conn.cursor()
     try:
-        # Таблица users
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            userId INT AUTO_INCREMENT PRIMARY KEY,
-            email VARCHAR(255) NOT NULL UNIQUE,
-            fullName VARCHAR(255) NOT NULL,
-            password VARCHAR(255) NOT NULL,
-            avatar VARCHAR(255) DEFAULT NULL,
-            emailConfirmation TINYINT(1) DEFAULT 0,
-            confirmationCode VARCHAR(50) DEFAULT NULL,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица categories
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS categories (
-            categoryId INT AUTO_INCREMENT PRIMARY KEY,
-            categoryName VARCHAR(255) NOT NULL
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица tariffs
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tariffs (
-            tariffId INT AUTO_INCREMENT PRIMARY KEY,
-            tariffName VARCHAR(255) NOT NULL,
-            minPhones INT NOT NULL DEFAULT 1,
-            maxPhones INT NOT NULL DEFAULT 1,
-            minSocials INT NOT NULL DEFAULT 0,
-            maxSocials INT NOT NULL DEFAULT 1,
-            minPhotos INT NOT NULL DEFAULT 1,
-            maxPhotos INT NOT NULL DEFAULT 1,
-            maxDescriptionLength INT NOT NULL DEFAULT 200,
-            websiteAllowed TINYINT(1) NOT NULL DEFAULT 0,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица promotions
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS promotions (
-            promotionId INT AUTO_INCREMENT PRIMARY KEY,
-            promotionName VARCHAR(255) NOT NULL,
-            description VARCHAR(255) DEFAULT NULL,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица cardPromotions
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cardPromotions (
-            cardPromotionId INT AUTO_INCREMENT PRIMARY KEY,
-            cardId INT NOT NULL,
-            promotionId INT NOT NULL,
-            startDate DATETIME DEFAULT CURRENT_TIMESTAMP,
-            endDate DATETIME
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица cards
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cards (
-            cardId INT AUTO_INCREMENT PRIMARY KEY,
-            userId INT NOT NULL,
-            categoryId INT NOT NULL,
-            tariffId INT NOT NULL,
-            cardName VARCHAR(255) NOT NULL,
-            description TEXT,
-            address VARCHAR(255),
-            locationLat DECIMAL(10, 6) DEFAULT NULL,
-            locationLng DECIMAL(10, 6) DEFAULT NULL,
-            website VARCHAR(255) DEFAULT NULL,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица cardPhoneNumbers
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cardPhoneNumbers (
-            phoneId INT AUTO_INCREMENT PRIMARY KEY,
-            cardId INT NOT NULL,
-            phoneNumber VARCHAR(20) NOT NULL,
-            FOREIGN KEY (cardId) REFERENCES cards(cardId)
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица cardSocialMedia
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cardSocialMedia (
-            socialId INT AUTO_INCREMENT PRIMARY KEY,
-            cardId INT NOT NULL,
-            socialType VARCHAR(100) NOT NULL,
-            socialLink VARCHAR(255) NOT NULL,
-            FOREIGN KEY (cardId) REFERENCES cards(cardId)
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица cardPhotos
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cardPhotos (
-            photoId INT AUTO_INCREMENT PRIMARY KEY,
-            cardId INT NOT NULL,
-            photoUrl VARCHAR(255) NOT NULL,
-            FOREIGN KEY (cardId) REFERENCES cards(cardId)
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица favorites
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS favorites (
-            favoriteId INT AUTO_INCREMENT PRIMARY KEY,
-            userId INT NOT NULL,
-            cardId INT NOT NULL,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (userId) REFERENCES users(userId),
-            FOREIGN KEY (cardId) REFERENCES cards(cardId),
-            UNIQUE KEY uniqueFavorite (userId, cardId)
-        ) ENGINE=InnoDB;
-        """)
-
-        # Таблица payments
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS payments (
-            paymentId INT AUTO_INCREMENT PRIMARY KEY,
-            userId INT NOT NULL,
-            cardId INT NOT NULL,           -- к какой карточке относится оплата
-            paymentType VARCHAR(50) NOT NULL,   -- 'tariff' или 'promotion'
-            tariffId INT DEFAULT NULL,     -- если paymentType='tariff', указываем tariffId
-            promotionId INT DEFAULT NULL,  -- если paymentType='promotion', указываем promotionId
-            orderId VARCHAR(255) NOT NULL UNIQUE,
-            amount INT NOT NULL,           -- сумма в тийинах
-            transactionId VARCHAR(255) DEFAULT NULL,
-            state INT NOT NULL DEFAULT 0,  -- 0=pending, 1=created, 2=performed, -1=canceled
-            reason INT DEFAULT NULL,       -- причина отмены, если state=-1
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB;
-        """)
-
-        conn.commit()
+        current = _getSchemaVersion(cursor)
+        if current is not None and current >= latest:
+            logging.info(f"Схема БД актуальна (версия {current}).")
+            return
+
+        cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATIONS_LOCK,))
+        if cursor.fetchone()[0] != 1:
+            logging.error("Не удалось получить блокировку миграций.")
+            return
+        try:
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                appliedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB;
+            """)
+            # Перечитываем под блокировкой: другой воркер мог успеть всё применить
+            current = _getSchemaVersion(cursor)
+            for version, fileName, statements in migrations:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    try:
+                        cursor.execute(statement)
+                    except DatabaseError as e:
+                        if e.errno not in _ALREADY_APPLIED_ERRNOS:
+                            raise
+                        logging.warning(f"Миграция {fileName}: изменение уже есть в базе ({e.msg})")
+                cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                               (version, fileName))
+                conn.commit()
+                logging.info(f"Применена миграция {fileName}")
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATIONS_LOCK,))
+            cursor.fetchone()
         logging.info("Инициализация БД завершена.")
     except Exception as e:
-        logging.error(f"Ошибка при создании таблиц: {e}")
+        logging.error(f"Ошибка при применении миграций: {e}")
         conn.rollback()
     finally:
         cursor.close()
@@ -177,9 +517,11 @@ def initDB():
 # -------------------- Класс Users -------------------- #
 class Users:
     @staticmethod
-    def createUserWithData(email, fullName, hashedPassword, confirmationCode):
+    def createUserWithData(email, fullName, hashedPassword, confirmationCode, confirmationEmail=None):
         """
         Создаёт пользователя (emailConfirmation=0, хранит confirmationCode).
+        confirmationEmail – (subject, body): письмо ставится в emailOutbox
+        в той же транзакции, отправит его фоновый воркер.
         Возвращает userId или None
         """
         conn = connect()
@@ -192,11 +534,15 @@ class Users:
                 INSERT INTO users (email, fullName, password, emailConfirmation, confirmationCode)
                 VALUES (%s, %s, %s, 0, %s)
             """, (email, fullName, hashedPassword, confirmationCode))
-            conn.commit()
             userId = cursor.lastrowid
+            if confirmationEmail:
+                subject, body = confirmationEmail
+                EmailOutboxDB.enqueue(cursor, email, subject, body)
+            conn.commit()
         except Exception as e:
             logging.error(f"Ошибка createUserWithData: {e}")
             conn.rollback()
+            userId = None
         finally:
             cursor.close()
             conn.close()
@@ -260,10 +606,12 @@ class Users:
         if not conn:
             return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM users WHERE email=%s", (email,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
         return row
 
     @staticmethod
@@ -272,16 +620,45 @@ class Users:
         if not conn:
             return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE userId=%s", (userId,))
-        row = cursor.fetchone()
+        try:
+            cursor.execute("SELECT * FROM users WHERE userId=%s", (userId,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        return row
+
+    @staticmethod
+    def updatePasswordHash(userId, hashedPassword):
+        """
+        Заменяет хеш пароля (перехеширование при смене стоимости bcrypt)
+        """
+        conn = connect()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE users
+                SET password=%s
+                WHERE userId=%s
+            """, (hashedPassword, userId))
+            conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка updatePasswordHash: {e}")
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return False
         cursor.close()
         conn.close()
-        return row
+        return True
 
     @staticmethod
-    def updateProfile(userId, fullName, avatarUrl=None):
+    def updateProfile(userId, fullName, avatarUrl=None, avatarThumb=None, avatarBlobId=None):
         """
-        Обновляет профиль пользователя: fullName и avatar.
+        Обновляет профиль пользователя: fullName и avatar (+ квадратное превью avatarThumb).
+        avatarBlobId – блоб нового аватара (ссылка в blobRefs заменяет прежнюю).
         Возвращает True при успешном обновлении, иначе False.
         """
         conn = connect()
@@ -292,9 +669,11 @@ class Users:
             if avatarUrl:
                 cursor.execute("""
                     UPDATE users
-                    SET fullName = %s, avatar = %s
+                    SET fullName = %s, avatar = %s, avatarThumb = %s
                     WHERE userId = %s
-                """, (fullName, avatarUrl, userId))
+                """, (fullName, avatarUrl, avatarThumb, userId))
+                if avatarBlobId:
+                    BlobsDB.replaceRefs(cursor, 'avatar', userId, [avatarBlobId])
             else:
                 cursor.execute("""
                     UPDATE users
@@ -313,40 +692,56 @@ class Users:
         return True
 
 # -------------------- Класс Cards -------------------- #
+# Сортировки списков карточек: ключ -> (столбец, по которому идёт keyset вместе с cardId)
+CARD_SORTS = {
+    "recent": "createdAt",     # новые первыми
+    "popular": "favoriteCount" # чаще всего добавляют в избранное (счётчик, без агрегации)
+}
+# Значение cards.geoPoint из (locationLng, locationLat); без координат – POINT(0, 0)
+GEO_POINT_SQL = "POINT(COALESCE(%s, 0), COALESCE(%s, 0))"
+METERS_PER_DEGREE = 111320.0
+
 class Cards:
     @staticmethod
-    def addCard(userId, categoryId, tariffId, cardName, description,
-                address, locationLat, locationLng, website):
+    def importCardChunk(records):
+        """
+        Массовый импорт: вставляет блок карточек с телефонами, соцсетями и фото
+        одной транзакцией на одном соединении. Дочерние строки – executemany
+        (мультистрочный INSERT). Каждая запись – словарь с полями карточки и
+        списками phoneNumbers, socialMedias, photoUrls (см. api/cardImport.py).
+        Возвращает (список cardId, None) или (None, текст ошибки) – блок откатан целиком.
+        """
         conn = connect()
         if not conn:
-            return None
+            return None, "Нет соединения с БД"
         cursor = conn.cursor()
-        cardId = None
         try:
-            cursor.execute("""
-                INSERT INTO cards
-                (userId, categoryId, tariffId, cardName, description, address,
-                locationLat, locationLng, website)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                userId, categoryId, tariffId, cardName, description, address,
-                locationLat, locationLng, website
-            ))
+            cardIds = [Cards.insertCardRow(cursor, record["userId"], record) for record in records]
+            pairs = list(zip(cardIds, records))
+            Cards.insertPhoneRows(cursor, [(cardId, phone) for cardId, record in pairs
+                                           for phone in record["phoneNumbers"]])
+            Cards.insertSocialRows(cursor, [(cardId, sm) for cardId, record in pairs
+                                            for sm in record["socialMedias"]])
+            Cards.insertPhotoRows(cursor, [(cardId, url) for cardId, record in pairs
+                                           for url in record["photoUrls"]])
+            bumpCacheVersion(cursor, 'catalog')
             conn.commit()
-            cardId = cursor.lastrowid
         except Exception as e:
-            logging.error(f"Ошибка addCard: {e}")
+            logging.error(f"Ошибка importCardChunk: {e}")
             conn.rollback()
+            return None, str(e)
         finally:
             cursor.close()
             conn.close()
-        return cardId
+        invalidateCaches('catalog')
+        return cardIds, None
 
     @staticmethod
-    def getCards(filters, page=1, perPage=25):
+    def getCards(filters, page=1, perPage=25, sort="recent"):
         """
         Получить список карточек с учетом фильтров и пагинации.
         filters – словарь с ключами: categoryId, userId (необязательно).
+        sort – ключ CARD_SORTS ("recent" или "popular").
         Возвращает словарь вида:
         { "pages": <общее число страниц>, "cards": [ список карточек ] }
         """
@@ -367,134 +762,277 @@ class Cards:
 
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-        query += " ORDER BY createdAt DESC"
+        query += f" ORDER BY {CARD_SORTS[sort]} DESC, cardId DESC"
 
-        # Получаем общее число карточек
-        countQuery = "SELECT COUNT(*) as total FROM cards"
-        if conditions:
-            countQuery += " WHERE " + " AND ".join(conditions)
-        cursor.execute(countQuery, tuple(params))
-        countRow = cursor.fetchone()
-        total = countRow['total'] if countRow and 'total' in countRow else 0
-        pages = (total + perPage - 1) // perPage
-
-        # Добавляем пагинацию
-        offset = (page - 1) * perPage
-        query += " LIMIT %s OFFSET %s"
-        params.extend([perPage, offset])
-        cursor.execute(query, tuple(params))
-        cardRows = cursor.fetchall()
-        cards = []
-        for cardRow in cardRows:
-            cardId = cardRow["cardId"]
-            # Получаем телефоны
-            cursor.execute("SELECT phoneNumber FROM cardPhoneNumbers WHERE cardId=%s", (cardId,))
-            phoneRows = cursor.fetchall()
-            # Получаем соцсети
-            cursor.execute("SELECT socialType, socialLink FROM cardSocialMedia WHERE cardId=%s", (cardId,))
-            socialRows = cursor.fetchall()
-            # Получаем фото
-            cursor.execute("SELECT photoUrl FROM cardPhotos WHERE cardId=%s", (cardId,))
-            photosRows = cursor.fetchall()
-
-            card = {
-                "cardId": cardRow["cardId"],
-                "userId": cardRow["userId"],
-                "categoryId": cardRow["categoryId"],
-                "cardName": cardRow["cardName"],
-                "description": cardRow["description"],
-                "address": cardRow["address"],
-                "locationLat": float(cardRow["locationLat"]) if cardRow["locationLat"] is not None else None,
-                "locationLng": float(cardRow["locationLng"]) if cardRow["locationLng"] is not None else None,
-                "website": cardRow["website"],
-                "tariffId": cardRow["tariffId"],
-                "createdAt": str(cardRow["createdAt"]),
-                "updatedAt": str(cardRow["updatedAt"]),
-                "phoneNumbers": [p["phoneNumber"] for p in phoneRows],
-                "socialMedias": socialRows,
-                "photos": [ph["photoUrl"] for ph in photosRows]
-            }
-            cards.append(card)
-        cursor.close()
-        conn.close()
+        try:
+            # Получаем общее число карточек
+            countQuery = "SELECT COUNT(*) as total FROM cards"
+            if conditions:
+                countQuery += " WHERE " + " AND ".join(conditions)
+            cursor.execute(countQuery, tuple(params))
+            countRow = cursor.fetchone()
+            total = countRow['total'] if countRow and 'total' in countRow else 0
+            pages = (total + perPage - 1) // perPage
+
+            # Добавляем пагинацию
+            offset = (page - 1) * perPage
+            query += " LIMIT %s OFFSET %s"
+            params.extend([perPage, offset])
+            cursor.execute(query, tuple(params))
+            cardRows = cursor.fetchall()
+            cards = Cards.hydrateCards(cursor, cardRows)
+        finally:
+            cursor.close()
+            conn.close()
         return {"pages": pages, "cards": cards}
 
     @staticmethod
-    def updateCardMainFields(userId, cardId, cardName, description,
-                             address, locationLat, locationLng,
-                             website, tariff):
+    def getCardsByCursor(filters, cursorToken=None, perPage=25, sort="recent"):
         """
-        Обновляем основные поля карточки, включая tariff.
-        Не трогаем телефоны, соцсети, фото (они перезаписываются отдельно).
-        Проверяем, что карточка принадлежит userId.
+        Keyset-пагинация по (createdAt, cardId) без COUNT(*) и OFFSET,
+        для sort="popular" – по (favoriteCount, cardId).
+        filters – как в getCards (categoryId, userId).
+        cursorToken – nextCursor из предыдущего ответа (None/"" – первая страница).
+        Возвращает { "cards": [...], "nextCursor": <str или None> }.
+        При некорректном cursorToken бросает ValueError.
         """
+        conditions = []
+        params = []
+        if 'categoryId' in filters:
+            conditions.append("categoryId = %s")
+            params.append(filters['categoryId'])
+        if 'userId' in filters:
+            conditions.append("userId = %s")
+            params.append(filters['userId'])
+        sortColumn = CARD_SORTS[sort]
+        if cursorToken:
+            lastValue, lastCardId = decodeCursor(cursorToken, 2)
+            # Значения курсора приходят от клиента: проверяем тип до запроса
+            lastValue = cursorInt(lastValue) if sort == "popular" else cursorDatetime(lastValue)
+            # Раскрытое сравнение (а не row constructor), чтобы MySQL
+            # использовал range-доступ по индексу (…, createdAt / favoriteCount)
+            conditions.append(f"({sortColumn} < %s OR ({sortColumn} = %s AND cardId < %s))")
+            params.extend([lastValue, lastValue, cursorInt(lastCardId)])
+
+        query = "SELECT * FROM cards"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+        query += f" ORDER BY {sortColumn} DESC, cardId DESC LIMIT %s"
+        params.append(perPage + 1)
+
         conn = connect()
         if not conn:
-            return False
-        cursor = conn.cursor()
+            return {"cards": [], "nextCursor": None}
+        cursor = conn.cursor(dictionary=True)
         try:
-            # Проверяем владельца
-            cursor.execute("SELECT userId FROM cards WHERE cardId=%s", (cardId,))
-            row = cursor.fetchone()
-            if not row or row[0] != userId:
-                cursor.close()
-                conn.close()
-                return False
+            cursor.execute(query, tuple(params))
+            cardRows = cursor.fetchall()
+            hasMore = len(cardRows) > perPage
+            cardRows = cardRows[:perPage]
+            cards = Cards.hydrateCards(cursor, cardRows)
+        finally:
+            cursor.close()
+            conn.close()
 
-            cursor.execute("""
-                UPDATE cards
-                SET cardName=%s, description=%s, address=%s,
-                    locationLat=%s, locationLng=%s,
-                    website=%s, tariff=%s
-                WHERE cardId=%s
-            """, (
-                cardName, description, address,
-                locationLat, locationLng,
-                website, tariff,
-                cardId
-            ))
-            conn.commit()
-        except Exception as e:
-            logging.error(f"Ошибка updateCardMainFields: {e}")
-            conn.rollback()
+        nextCursor = None
+        if hasMore and cardRows:
+            last = cardRows[-1]
+            nextCursor = encodeCursor(last[sortColumn], last["cardId"])
+        return {"cards": cards, "nextCursor": nextCursor}
+
+    @staticmethod
+    def searchCards(queryText, categoryId=None, cursorToken=None, perPage=25):
+        """
+        Полнотекстовый поиск по cardName, description, address (FULLTEXT ftCardsText).
+        Сортировка по релевантности, keyset-пагинация по (score, cardId).
+        Возвращает { "cards": [...], "nextCursor": <str или None> },
+        у каждой карточки есть поле score.
+        При некорректном cursorToken бросает ValueError.
+        """
+        match = "MATCH(cardName, description, address) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+        innerConditions = [match]
+        params = [queryText, queryText]
+        if categoryId is not None:
+            innerConditions.append("categoryId = %s")
+            params.append(categoryId)
+
+        query = f"""
+            SELECT * FROM (
+                SELECT c.*, {match} AS score
+                FROM cards c
+                WHERE {" AND ".join(innerConditions)}
+            ) ranked
+        """
+        if cursorToken:
+            lastScore, lastCardId = decodeCursor(cursorToken, 2)
+            # Значения курсора приходят от клиента: проверяем тип до запроса
+            lastScore = cursorFloat(lastScore)
+            query += " WHERE score < %s OR (score = %s AND cardId < %s)"
+            params.extend([lastScore, lastScore, cursorInt(lastCardId)])
+        query += " ORDER BY score DESC, cardId DESC LIMIT %s"
+        params.append(perPage + 1)
+
+        conn = connect()
+        if not conn:
+            return {"cards": [], "nextCursor": None}
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, tuple(params))
+            cardRows = cursor.fetchall()
+            hasMore = len(cardRows) > perPage
+            cardRows = cardRows[:perPage]
+            cards = Cards.hydrateCards(cursor, cardRows)
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
-        return True
+
+        for card, row in zip(cards, cardRows):
+            card["score"] = float(row["score"])
+        nextCursor = None
+        if hasMore and cardRows:
+            last = cardRows[-1]
+            nextCursor = encodeCursor(float(last["score"]), last["cardId"])
+        return {"cards": cards, "nextCursor": nextCursor}
 
     @staticmethod
-    def getCardById(cardId: int):
+    def getNearbyCards(lat, lng, radius, categoryId=None, limit=25):
         """
-        Возвращает полную информацию о карточке, включая телефоны, соцсети, фото.
+        Карточки в радиусе radius метров от (lat, lng), ближайшие первыми.
+        Сначала прямоугольник вокруг точки через SPATIAL-индекс spCardsGeoPoint
+        (MBRContains), затем точное расстояние ST_Distance_Sphere.
+        У каждой карточки есть поле distance (в метрах).
+        """
+        dLat = radius / METERS_PER_DEGREE
+        dLng = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        minLat, maxLat = max(lat - dLat, -90.0), min(lat + dLat, 90.0)
+        minLng, maxLng = max(lng - dLng, -180.0), min(lng + dLng, 180.0)
+        box = (f"POLYGON(({minLng} {minLat}, {maxLng} {minLat}, {maxLng} {maxLat}, "
+               f"{minLng} {maxLat}, {minLng} {minLat}))")
+
+        query = """
+            SELECT c.*, ST_Distance_Sphere(c.geoPoint, POINT(%s, %s)) AS distance
+            FROM cards c
+            WHERE MBRContains(ST_GeomFromText(%s), c.geoPoint)
+              AND c.locationLat IS NOT NULL AND c.locationLng IS NOT NULL
         """
+        params = [lng, lat, box]
+        if categoryId is not None:
+            query += " AND c.categoryId = %s"
+            params.append(categoryId)
+        query += " HAVING distance <= %s ORDER BY distance, cardId LIMIT %s"
+        params.extend([radius, limit])
+
         conn = connect()
         if not conn:
-            return None
+            return []
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM cards WHERE cardId=%s", (cardId,))
-        cardRow = cursor.fetchone()
-        if not cardRow:
+        try:
+            cursor.execute(query, tuple(params))
+            cardRows = cursor.fetchall()
+            cards = Cards.hydrateCards(cursor, cardRows)
+        finally:
             cursor.close()
             conn.close()
-            return None
 
-        # Телефоны
-        cursor.execute("SELECT phoneNumber FROM cardPhoneNumbers WHERE cardId=%s", (cardId,))
-        phoneRows = cursor.fetchall()
+        for card, row in zip(cards, cardRows):
+            card["distance"] = round(float(row["distance"]), 1)
+        return cards
 
-        # Соцсети
-        cursor.execute("SELECT socialType, socialLink FROM cardSocialMedia WHERE cardId=%s", (cardId,))
-        socialRows = cursor.fetchall()
+    @staticmethod
+    def getTopCardsPerCategory(perCategory=10, sort="recent"):
+        """
+        Первые perCategory карточек каждой категории (по CARD_SORTS[sort]:
+        последние или самые популярные) одним оконным запросом
+        (ROW_NUMBER() OVER (PARTITION BY categoryId ...)) + пачечная гидратация.
+        Число запросов не зависит от количества категорий.
+        Возвращает словарь { categoryId: [ список карточек ] } или None при ошибке.
+        """
+        conn = connect()
+        if not conn:
+            return None
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT * FROM (
+                    SELECT c.*,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY c.categoryId
+                               ORDER BY c.{CARD_SORTS[sort]} DESC, c.cardId DESC
+                           ) AS rowNum
+                    FROM cards c
+                ) ranked
+                WHERE rowNum <= %s
+                ORDER BY categoryId, rowNum
+            """, (perCategory,))
+            cardRows = cursor.fetchall()
+            cards = Cards.hydrateCards(cursor, cardRows)
+        finally:
+            cursor.close()
+            conn.close()
 
-        # Фото
-        cursor.execute("SELECT photoUrl FROM cardPhotos WHERE cardId=%s", (cardId,))
-        photosRows = cursor.fetchall()
+        result = {}
+        for card in cards:
+            result.setdefault(card["categoryId"], []).append(card)
+        return result
 
-        cursor.close()
-        conn.close()
+    # ----------------------------------------------------------------
+    # Гидратация: телефоны, соцсети и фото пачкой для списка карточек
+    # ----------------------------------------------------------------
+    @staticmethod
+    def hydrateCards(cursor, cardRows):
+        """
+        Дополняет строки cards телефонами, соцсетями и фото.
+        Вместо 3 запросов на карточку делает по одному запросу на дочернюю
+        таблицу (WHERE cardId IN (...)) и группирует строки в памяти.
+        cursor – открытый курсор с dictionary=True.
+        Возвращает список карточек в формате API в порядке cardRows.
+        """
+        if not cardRows:
+            return []
+        cardIds = [row["cardId"] for row in cardRows]
+        placeholders = ", ".join(["%s"] * len(cardIds))
+        phones = {cardId: [] for cardId in cardIds}
+        socials = {cardId: [] for cardId in cardIds}
+        photos = {cardId: [] for cardId in cardIds}
+
+        cursor.execute(f"""
+            SELECT cardId, phoneNumber FROM cardPhoneNumbers
+            WHERE cardId IN ({placeholders}) ORDER BY cardId, phoneId
+        """, tuple(cardIds))
+        for row in cursor.fetchall():
+            phones[row["cardId"]].append(row["phoneNumber"])
+
+        cursor.execute(f"""
+            SELECT cardId, socialType, socialLink FROM cardSocialMedia
+            WHERE cardId IN ({placeholders}) ORDER BY cardId, socialId
+        """, tuple(cardIds))
+        for row in cursor.fetchall():
+            socials[row["cardId"]].append({
+                "socialType": row["socialType"],
+                "socialLink": row["socialLink"]
+            })
+
+        cursor.execute(f"""
+            SELECT cardId, photoUrl, thumbUrl, detailUrl FROM cardPhotos
+            WHERE cardId IN ({placeholders}) ORDER BY cardId, photoId
+        """, tuple(cardIds))
+        for row in cursor.fetchall():
+            photos[row["cardId"]].append(row)
+
+        return [
+            Cards.formatCard(row, phones[row["cardId"]], socials[row["cardId"]], photos[row["cardId"]])
+            for row in cardRows
+        ]
 
+    @staticmethod
+    def formatCard(cardRow, phoneNumbers, socialMedias, photoRows):
+        """
+        Приводит строку cards и её дочерние записи к формату ответа API.
+        photos – ссылки на оригиналы (как раньше), photoVariants – в том же
+        порядке ссылки на превью для списка (thumb) и страницы карточки (detail);
+        для старых фото без превью там ссылка на оригинал.
+        """
         return {
             "cardId": cardRow["cardId"],
             "userId": cardRow["userId"],
@@ -502,89 +1040,98 @@ class Cards:
             "cardName": cardRow["cardName"],
             "description": cardRow["description"],
             "address": cardRow["address"],
-            "locationLat": float(cardRow["locationLat"]) if cardRow["locationLat"] else None,
-            "locationLng": float(cardRow["locationLng"]) if cardRow["locationLng"] else None,
+            "locationLat": float(cardRow["locationLat"]) if cardRow["locationLat"] is not None else None,
+            "locationLng": float(cardRow["locationLng"]) if cardRow["locationLng"] is not None else None,
             "website": cardRow["website"],
             "tariffId": cardRow["tariffId"],
+            "favoriteCount": cardRow["favoriteCount"],
             "createdAt": str(cardRow["createdAt"]),
             "updatedAt": str(cardRow["updatedAt"]),
-            "phoneNumbers": [p["phoneNumber"] for p in phoneRows],
-            "socialMedias": socialRows,
-            "photos": [ph["photoUrl"] for ph in photosRows]
+            "phoneNumbers": phoneNumbers,
+            "socialMedias": socialMedias,
+            "photos": [ph["photoUrl"] for ph in photoRows],
+            "photoVariants": [
+                {
+                    "original": ph["photoUrl"],
+                    "thumb": ph["thumbUrl"] or ph["photoUrl"],
+                    "detail": ph["detailUrl"] or ph["photoUrl"]
+                }
+                for ph in photoRows
+            ]
         }
 
     @staticmethod
-    def deleteCard(userId: int, cardId: int):
+    def getCardVersion(cardId: int):
         """
-        Удаляем карточку, если она принадлежит userId.
+        Дешёвая проверка актуальности карточки (поиск по PK, без дочерних таблиц).
+        Возвращает {"version": int} или None.
         """
         conn = connect()
         if not conn:
-            return False
-        cursor = conn.cursor()
+            return None
+        cursor = conn.cursor(dictionary=True)
         try:
-            # Проверяем владельца
-            cursor.execute("SELECT userId FROM cards WHERE cardId=%s", (cardId,))
+            cursor.execute("SELECT version FROM cards WHERE cardId=%s", (cardId,))
             row = cursor.fetchone()
-            if not row or row[0] != userId:
-                cursor.close()
-                conn.close()
-                return False
-
-            cursor.execute("DELETE FROM cards WHERE cardId=%s", (cardId,))
-            conn.commit()
-        except Exception as e:
-            logging.error(f"Ошибка deleteCard: {e}")
-            conn.rollback()
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
-        return True
+        return row
 
-    # ----------------------------------------------------------------
-    # Методы для телефонов
-    # ----------------------------------------------------------------
     @staticmethod
-    def deleteAllPhones(cardId: int):
+    def touchCard(cursor, cardId: int):
+        """
+        Увеличивает версию карточки (и updatedAt) при изменении дочерних записей,
+        чтобы ETag одиночной карточки тоже поменялся.
+        """
+        cursor.execute("UPDATE cards SET version = version + 1 WHERE cardId=%s", (cardId,))
+
+    @staticmethod
+    def getCardById(cardId: int):
+        """
+        Возвращает полную информацию о карточке, включая телефоны, соцсети, фото.
+        """
         conn = connect()
         if not conn:
-            return False
-        cursor = conn.cursor()
+            return None
+        cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute("DELETE FROM cardPhoneNumbers WHERE cardId=%s", (cardId,))
-            conn.commit()
-        except Exception as e:
-            logging.error(f"Ошибка deleteAllPhones: {e}")
-            conn.rollback()
+            cursor.execute("SELECT * FROM cards WHERE cardId=%s", (cardId,))
+            cardRow = cursor.fetchone()
+            if not cardRow:
+                return None
+
+            card = Cards.hydrateCards(cursor, [cardRow])[0]
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
-        return True
+        return card
 
     @staticmethod
-    def addPhoneNumbers(cardId: int, phoneNumbers: list):
+    def deleteCard(userId: int, cardId: int):
         """
-        Добавляет список phoneNumbers. Если phoneNumbers пуст, пропускаем.
+        Удаляем карточку, если она принадлежит userId.
         """
-        if not phoneNumbers:
-            return True
         conn = connect()
         if not conn:
             return False
         cursor = conn.cursor()
         try:
-            for phone in phoneNumbers:
-                cursor.execute("""
-                    INSERT INTO cardPhoneNumbers (cardId, phoneNumber)
-                    VALUES (%s, %s)
-                """, (cardId, phone))
+            # Проверяем владельца
+            cursor.execute("SELECT userId FROM cards WHERE cardId=%s", (cardId,))
+            row = cursor.fetchone()
+            if not row or row[0] != userId:
+                cursor.close()
+                conn.close()
+                return False
+
+            cursor.execute("DELETE FROM cards WHERE cardId=%s", (cardId,))
+            BlobsDB.replaceRefs(cursor, 'card', cardId, [])
+            bumpCacheVersion(cursor, 'catalog')
             conn.commit()
+            invalidateCaches('catalog')
         except Exception as e:
-            logging.error(f"Ошибка addPhoneNumbers: {e}")
+            logging.error(f"Ошибка deleteCard: {e}")
             conn.rollback()
             cursor.close()
             conn.close()
@@ -594,131 +1141,411 @@ class Cards:
         return True
 
     # ----------------------------------------------------------------
-    # Методы для соцсетей
+    # Запись строк карточки на курсоре вызывающей транзакции
+    # (CardWriter, importCardChunk): по одному запросу на таблицу
     # ----------------------------------------------------------------
     @staticmethod
-    def deleteAllSocials(cardId: int):
-        conn = connect()
-        if not conn:
-            return False
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM cardSocialMedia WHERE cardId=%s", (cardId,))
-            conn.commit()
-        except Exception as e:
-            logging.error(f"Ошибка deleteAllSocials: {e}")
-            conn.rollback()
-            cursor.close()
-            conn.close()
-            return False
-        cursor.close()
-        conn.close()
-        return True
+    def insertCardRow(cursor, userId, fields):
+        """
+        INSERT в cards (с geoPoint). fields – categoryId, tariffId, cardName,
+        description, address, locationLat, locationLng, website. Возвращает cardId.
+        """
+        cursor.execute(f"""
+            INSERT INTO cards
+            (userId, categoryId, tariffId, cardName, description, address,
+            locationLat, locationLng, website, geoPoint)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, {GEO_POINT_SQL})
+        """, (
+            userId, fields["categoryId"], fields["tariffId"], fields["cardName"],
+            fields["description"], fields["address"],
+            fields["locationLat"], fields["locationLng"], fields["website"],
+            fields["locationLng"], fields["locationLat"]
+        ))
+        return cursor.lastrowid
+
+    @staticmethod
+    def insertPhoneRows(cursor, rows):
+        """rows – [(cardId, phoneNumber), ...]; один мультистрочный INSERT."""
+        if rows:
+            cursor.executemany(
+                "INSERT INTO cardPhoneNumbers (cardId, phoneNumber) VALUES (%s, %s)", rows)
 
     @staticmethod
-    def addSocialMedia(cardId: int, socialMedias: list):
+    def insertSocialRows(cursor, rows):
         """
-        Добавляет список соцсетей:
-        [
-          {"socialType":"instagram","socialLink":"..."},
-          ...
-        ]
+        rows – [(cardId, {"socialType": ..., "socialLink": ...}), ...];
+        записи без типа или ссылки пропускаются.
+        """
+        values = []
+        for cardId, sm in rows:
+            sType = sm.get('socialType', '').strip()
+            sLink = sm.get('socialLink', '').strip()
+            if sType and sLink:
+                values.append((cardId, sType, sLink))
+        if values:
+            cursor.executemany(
+                "INSERT INTO cardSocialMedia (cardId, socialType, socialLink) VALUES (%s, %s, %s)", values)
+
+    @staticmethod
+    def insertPhotoRows(cursor, rows):
+        """
+        rows – [(cardId, photo), ...], photo – ссылка или словарь
+        {"blobId": ..., "original": ..., "thumb": ..., "detail": ...} из api/images.py.
+        Заодно добавляет ссылки на блобы (blobRefs).
+        """
+        values = []
+        refRows = []
+        for cardId, photo in rows:
+            if isinstance(photo, str):
+                photo = {"original": photo}
+            values.append((cardId, photo["original"], photo.get("thumb"), photo.get("detail"), photo.get("blobId")))
+            if photo.get("blobId"):
+                refRows.append(('card', cardId, photo["blobId"]))
+        if values:
+            cursor.executemany("""
+                INSERT INTO cardPhotos (cardId, photoUrl, thumbUrl, detailUrl, blobId)
+                VALUES (%s, %s, %s, %s, %s)
+            """, values)
+        BlobsDB.addRefRows(cursor, refRows)
+
+# -------------------- Класс CardWriter -------------------- #
+class CardWriter:
+    """
+    Запись карточки целиком (POST/PUT /api/cards): строка cards, телефоны,
+    соцсети и фото – на одном соединении в одной транзакции, дочерние
+    строки – мультистрочными INSERT. Ошибка на любом шаге откатывает всё,
+    наполовину записанных карточек не остаётся.
+    """
+    @staticmethod
+    def createCard(userId, fields, phoneNumbers, socialMedias, photos):
+        """
+        fields – см. Cards.insertCardRow; photos – результат storeImageUpload или ссылки.
+        Возвращает cardId или None.
         """
-        if not socialMedias:
-            return True
         conn = connect()
         if not conn:
-            return False
+            return None
         cursor = conn.cursor()
         try:
-            for sm in socialMedias:
-                sType = sm.get('socialType','').strip()
-                sLink = sm.get('socialLink','').strip()
-                if sType and sLink:
-                    cursor.execute("""
-                        INSERT INTO cardSocialMedia (cardId, socialType, socialLink)
-                        VALUES (%s, %s, %s)
-                    """, (cardId, sType, sLink))
+            cardId = Cards.insertCardRow(cursor, userId, fields)
+            Cards.insertPhoneRows(cursor, [(cardId, phone) for phone in phoneNumbers])
+            Cards.insertSocialRows(cursor, [(cardId, sm) for sm in socialMedias])
+            Cards.insertPhotoRows(cursor, [(cardId, photo) for photo in photos])
+            bumpCacheVersion(cursor, 'catalog')
             conn.commit()
         except Exception as e:
-            logging.error(f"Ошибка addSocialMedia: {e}")
+            logging.error(f"Ошибка createCard: {e}")
             conn.rollback()
+            return None
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
-        return True
+        invalidateCaches('catalog')
+        return cardId
 
-    # ----------------------------------------------------------------
-    # Методы для фото
-    # ----------------------------------------------------------------
     @staticmethod
-    def deleteAllPhotos(cardId: int):
+    def updateCard(userId, cardId, fields, phoneNumbers, socialMedias, keepPhotos, newPhotos):
+        """
+        Полное обновление карточки: основные поля (кроме categoryId), телефоны,
+        соцсети и фото. Дочерние записи сравниваются с текущими – удаляются
+        только лишние строки и вставляются только новые (см. _diffChildRows).
+        keepPhotos – ссылки (photoUrl) или blobId уже загруженных фото, которые
+        остаются; newPhotos – результат storeImageUpload для новых файлов.
+        Строка карточки блокируется (FOR UPDATE) на время транзакции.
+        Возвращает False, если карточка не найдена, принадлежит другому
+        пользователю или запись не удалась; ValueError – если в keepPhotos
+        есть фото, которого нет в карточке.
+        """
         conn = connect()
         if not conn:
             return False
-        cursor = conn.cursor()
+        cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute("DELETE FROM cardPhotos WHERE cardId=%s", (cardId,))
+            cursor.execute("SELECT userId FROM cards WHERE cardId=%s FOR UPDATE", (cardId,))
+            row = cursor.fetchone()
+            if not row or row["userId"] != userId:
+                conn.rollback()
+                return False
+
+            cursor.execute(f"""
+                UPDATE cards
+                SET cardName=%s, description=%s, address=%s,
+                    locationLat=%s, locationLng=%s, geoPoint={GEO_POINT_SQL},
+                    website=%s, tariffId=%s, version = version + 1
+                WHERE cardId=%s
+            """, (
+                fields["cardName"], fields["description"], fields["address"],
+                fields["locationLat"], fields["locationLng"],
+                fields["locationLng"], fields["locationLat"],
+                fields["website"], fields["tariffId"],
+                cardId
+            ))
+            CardWriter.syncPhones(cursor, cardId, phoneNumbers)
+            CardWriter.syncSocials(cursor, cardId, socialMedias)
+            CardWriter.syncPhotos(cursor, cardId, keepPhotos, newPhotos)
+            bumpCacheVersion(cursor, 'catalog')
             conn.commit()
+        except ValueError:
+            conn.rollback()
+            raise
         except Exception as e:
-            logging.error(f"Ошибка deleteAllPhotos: {e}")
+            logging.error(f"Ошибка updateCard: {e}")
             conn.rollback()
+            return False
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
+        invalidateCaches('catalog')
         return True
 
+    # Поля cards, которые можно менять через PATCH
+    PATCH_FIELDS = ("tariffId", "cardName", "description", "address",
+                    "locationLat", "locationLng", "website")
+
     @staticmethod
-    def addPhotos(cardId: int, photoUrls: list):
+    def patchCard(userId, cardId, fields, phoneNumbers=None, socialMedias=None,
+                  removePhotos=(), newPhotos=(), validate=None):
         """
-        Добавляем записи в cardPhotos (photoUrl).
-        photoUrls – список строк (ссылок).
+        Частичное обновление (PATCH /api/cards). Передаются только изменения:
+          - fields – подмножество PATCH_FIELDS;
+          - phoneNumbers / socialMedias – новый список или None (не менять);
+          - removePhotos – photoUrl или blobId удаляемых фото, newPhotos – новые фото.
+        Текущее состояние читается один раз под блокировкой строки (FOR UPDATE)
+        вместе с количеством телефонов/соцсетей/фото. validate(merged) проверяет
+        итоговое состояние {"tariffId", "description", "website", "phoneCount",
+        "socialCount", "photoCount"} и возвращает текст ошибки или None.
+        Выполняются только нужные запросы: UPDATE лишь изменившихся полей,
+        дочерние таблицы – только переданные и только по разнице.
+        Возвращает False, если карточка не найдена / чужая / запись не удалась;
+        ValueError – если итоговое состояние не проходит validate или фото нет в карточке.
         """
-        if not photoUrls:
-            return True
         conn = connect()
         if not conn:
             return False
-        cursor = conn.cursor()
+        cursor = conn.cursor(dictionary=True)
         try:
-            for url in photoUrls:
-                cursor.execute("""
-                    INSERT INTO cardPhotos (cardId, photoUrl)
-                    VALUES (%s, %s)
-                """, (cardId, url))
+            cursor.execute("""
+                SELECT c.*,
+                    (SELECT COUNT(*) FROM cardPhoneNumbers p WHERE p.cardId = c.cardId) AS phoneCount,
+                    (SELECT COUNT(*) FROM cardSocialMedia s WHERE s.cardId = c.cardId) AS socialCount,
+                    (SELECT COUNT(*) FROM cardPhotos ph WHERE ph.cardId = c.cardId) AS photoCount
+                FROM cards c WHERE c.cardId=%s FOR UPDATE
+            """, (cardId,))
+            current = cursor.fetchone()
+            if not current or current["userId"] != userId:
+                conn.rollback()
+                return False
+
+            changed = {}
+            for key in CardWriter.PATCH_FIELDS:
+                if key in fields and not _sameValue(current[key], fields[key]):
+                    changed[key] = fields[key]
+            merged = {key: changed.get(key, current[key]) for key in CardWriter.PATCH_FIELDS}
+
+            if socialMedias is not None:
+                socialMedias = [sm for sm in socialMedias
+                                if sm.get('socialType', '').strip() and sm.get('socialLink', '').strip()]
+            photoRows = None
+            keepPhotos = None
+            photoCount = current["photoCount"]
+            if removePhotos or newPhotos:
+                photoRows = CardWriter.loadPhotoRows(cursor, cardId)
+                removedIds = set()
+                for ref in removePhotos:
+                    match = next((row for row in photoRows if row["photoId"] not in removedIds
+                                  and ref in (row["photoUrl"], row["blobId"])), None)
+                    if match is None:
+                        raise ValueError(f"Фото {ref} не найдено в карточке")
+                    removedIds.add(match["photoId"])
+                keepPhotos = [row["photoUrl"] for row in photoRows if row["photoId"] not in removedIds]
+                photoCount = len(keepPhotos) + len(newPhotos)
+
+            if validate:
+                error = validate({
+                    "tariffId": merged["tariffId"],
+                    "description": merged["description"],
+                    "website": merged["website"],
+                    "phoneCount": len(phoneNumbers) if phoneNumbers is not None else current["phoneCount"],
+                    "socialCount": len(socialMedias) if socialMedias is not None else current["socialCount"],
+                    "photoCount": photoCount
+                })
+                if error:
+                    raise ValueError(error)
+
+            if changed:
+                sets = [f"{key}=%s" for key in changed]
+                params = list(changed.values())
+                if "locationLat" in changed or "locationLng" in changed:
+                    sets.append(f"geoPoint={GEO_POINT_SQL}")
+                    params.extend([merged["locationLng"], merged["locationLat"]])
+                cursor.execute(f"UPDATE cards SET {', '.join(sets)}, version = version + 1 WHERE cardId=%s",
+                               (*params, cardId))
+
+            childChanged = False
+            if phoneNumbers is not None:
+                childChanged |= CardWriter.syncPhones(cursor, cardId, phoneNumbers)
+            if socialMedias is not None:
+                childChanged |= CardWriter.syncSocials(cursor, cardId, socialMedias)
+            if keepPhotos is not None:
+                childChanged |= CardWriter.syncPhotos(cursor, cardId, keepPhotos, list(newPhotos), rows=photoRows)
+
+            if not changed and not childChanged:
+                # Ничего не изменилось – ни записи, ни сброса кэша каталога
+                conn.rollback()
+                return True
+            if not changed:
+                Cards.touchCard(cursor, cardId)
+            bumpCacheVersion(cursor, 'catalog')
             conn.commit()
+        except ValueError:
+            conn.rollback()
+            raise
         except Exception as e:
-            logging.error(f"Ошибка addPhotos: {e}")
+            logging.error(f"Ошибка patchCard: {e}")
             conn.rollback()
+            return False
+        finally:
             cursor.close()
             conn.close()
-            return False
-        cursor.close()
-        conn.close()
+        invalidateCaches('catalog')
         return True
 
+    # ----------------------------------------------------------------
+    # Синхронизация дочерних записей с желаемым списком
+    # (курсор с dictionary=True, строка карточки уже заблокирована)
+    # ----------------------------------------------------------------
+    @staticmethod
+    def syncPhones(cursor, cardId, phoneNumbers):
+        """Возвращает True, если что-то записано (здесь и в syncSocials/syncPhotos)."""
+        cursor.execute("SELECT phoneId, phoneNumber FROM cardPhoneNumbers WHERE cardId=%s", (cardId,))
+        existing = [(row["phoneId"], row["phoneNumber"]) for row in cursor.fetchall()]
+        removeIds, added = _diffChildRows(existing, phoneNumbers, lambda phone: phone)
+        _deleteByIds(cursor, "cardPhoneNumbers", "phoneId", removeIds)
+        Cards.insertPhoneRows(cursor, [(cardId, phone) for phone in added])
+        return bool(removeIds or added)
+
+    @staticmethod
+    def syncSocials(cursor, cardId, socialMedias):
+        socialMedias = [
+            {"socialType": sm.get('socialType', '').strip(), "socialLink": sm.get('socialLink', '').strip()}
+            for sm in socialMedias
+        ]
+        socialMedias = [sm for sm in socialMedias if sm["socialType"] and sm["socialLink"]]
+        cursor.execute("SELECT socialId, socialType, socialLink FROM cardSocialMedia WHERE cardId=%s", (cardId,))
+        existing = [(row["socialId"], (row["socialType"], row["socialLink"])) for row in cursor.fetchall()]
+        removeIds, added = _diffChildRows(existing, socialMedias,
+                                          lambda sm: (sm["socialType"], sm["socialLink"]))
+        _deleteByIds(cursor, "cardSocialMedia", "socialId", removeIds)
+        Cards.insertSocialRows(cursor, [(cardId, sm) for sm in added])
+        return bool(removeIds or added)
+
+    @staticmethod
+    def loadPhotoRows(cursor, cardId):
+        cursor.execute("SELECT photoId, photoUrl, blobId FROM cardPhotos WHERE cardId=%s ORDER BY photoId", (cardId,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def syncPhotos(cursor, cardId, keepPhotos, newPhotos, rows=None):
+        """
+        Оставляет фото из keepPhotos (по photoUrl или blobId), добавляет newPhotos,
+        остальные удаляет вместе со ссылками на блобы. Новый файл с тем же
+        содержимым, что у уже сохранённого фото (тот же blobId), не дублируется.
+        rows – уже загруженные loadPhotoRows, чтобы не читать их повторно.
+        """
+        if rows is None:
+            rows = CardWriter.loadPhotoRows(cursor, cardId)
+        keptIds = set()
+        for ref in keepPhotos:
+            match = next((row for row in rows if row["photoId"] not in keptIds
+                          and ref in (row["photoUrl"], row["blobId"])), None)
+            if match is None:
+                raise ValueError(f"Фото {ref} не найдено в карточке")
+            keptIds.add(match["photoId"])
+
+        added = []
+        for photo in newPhotos:
+            blobId = photo.get("blobId") if isinstance(photo, dict) else None
+            match = next((row for row in rows if row["photoId"] not in keptIds
+                          and blobId and row["blobId"] == blobId), None)
+            if match is None:
+                added.append(photo)
+            else:
+                keptIds.add(match["photoId"])
+
+        removed = [row for row in rows if row["photoId"] not in keptIds]
+        _deleteByIds(cursor, "cardPhotos", "photoId", [row["photoId"] for row in removed])
+        keptBlobs = {row["blobId"] for row in rows if row["photoId"] in keptIds}
+        BlobsDB.removeRefs(cursor, 'card', cardId,
+                           {row["blobId"] for row in removed if row["blobId"]} - keptBlobs)
+        Cards.insertPhotoRows(cursor, [(cardId, photo) for photo in added])
+        return bool(removed or added)
+
+
+def _diffChildRows(existing, desired, keyOf):
+    """
+    existing – [(id строки, ключ), ...], desired – желаемые элементы.
+    Совпадающие по ключу строки остаются (с учётом повторов).
+    Возвращает (id строк на удаление, элементы на вставку).
+    """
+    available = {}
+    for rowId, key in existing:
+        available.setdefault(key, []).append(rowId)
+    added = []
+    for item in desired:
+        ids = available.get(keyOf(item))
+        if ids:
+            ids.pop(0)
+        else:
+            added.append(item)
+    removeIds = [rowId for ids in available.values() for rowId in ids]
+    return removeIds, added
+
+
+def _sameValue(current, new):
+    """Сравнение значения из БД с новым (DECIMAL координат – с точностью столбца)."""
+    if current is None or new is None:
+        return current is None and new is None
+    if isinstance(new, float):
+        return round(float(current), 6) == round(new, 6)
+    return current == new
+
+
+def _deleteByIds(cursor, table, idColumn, rowIds):
+    if rowIds:
+        placeholders = ", ".join(["%s"] * len(rowIds))
+        cursor.execute(f"DELETE FROM {table} WHERE {idColumn} IN ({placeholders})", tuple(rowIds))
+
 # -------------------- Класс Categories -------------------- #
 class Categories:
     @staticmethod
     def getAllCategories():
+        """Список категорий из кэша справочников (см. ReferenceCache)."""
+        categories = categoriesCache.get()
+        if categories is None:
+            return []
+        return [dict(row) for row in categories]
+
+    @staticmethod
+    def _loadAllCategories():
         conn = connect()
         if not conn:
-            return []
+            return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM categories")
-        categories = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM categories")
+            categories = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Ошибка _loadAllCategories: {e}")
+            categories = None
+        finally:
+            cursor.close()
+            conn.close()
         return categories
 
     @staticmethod
-    def addCategory(categoryName, logo=None):
+    def addCategory(categoryName, logo=None, logoThumb=None, logoBlobId=None):
         """
-        Добавить новую категорию с логотипом.
+        Добавить новую категорию с логотипом (и его квадратным превью).
         Возвращает categoryId или None.
         """
         conn = connect()
@@ -727,10 +1554,14 @@ class Categories:
         cursor = conn.cursor()
         categoryId = None
         try:
-            cursor.execute("INSERT INTO categories (categoryName, logo) VALUES (%s, %s)",
-                           (categoryName, logo))
-            conn.commit()
+            cursor.execute("INSERT INTO categories (categoryName, logo, logoThumb) VALUES (%s, %s, %s)",
+                           (categoryName, logo, logoThumb))
             categoryId = cursor.lastrowid
+            if logoBlobId:
+                BlobsDB.addRefs(cursor, 'category', categoryId, [logoBlobId])
+            bumpCacheVersion(cursor, 'categories', 'catalog')
+            conn.commit()
+            invalidateCaches('categories', 'catalog')
         except Exception as e:
             logging.error(f"Ошибка addCategory: {e}")
             conn.rollback()
@@ -740,7 +1571,7 @@ class Categories:
         return categoryId
 
     @staticmethod
-    def updateCategory(categoryId, categoryName, logo=None):
+    def updateCategory(categoryId, categoryName, logo=None, logoThumb=None, logoBlobId=None):
         """
         Обновить категорию: изменяются имя и логотип (если предоставлен).
         """
@@ -752,16 +1583,20 @@ class Categories:
             if logo:
                 cursor.execute("""
                     UPDATE categories
-                    SET categoryName=%s, logo=%s
+                    SET categoryName=%s, logo=%s, logoThumb=%s
                     WHERE categoryId=%s
-                """, (categoryName, logo, categoryId))
+                """, (categoryName, logo, logoThumb, categoryId))
+                if logoBlobId:
+                    BlobsDB.replaceRefs(cursor, 'category', categoryId, [logoBlobId])
             else:
                 cursor.execute("""
                     UPDATE categories
                     SET categoryName=%s
                     WHERE categoryId=%s
                 """, (categoryName, categoryId))
+            bumpCacheVersion(cursor, 'categories', 'catalog')
             conn.commit()
+            invalidateCaches('categories', 'catalog')
         except Exception as e:
             logging.error(f"Ошибка updateCategory: {e}")
             conn.rollback()
@@ -780,7 +1615,10 @@ class Categories:
         cursor = conn.cursor()
         try:
             cursor.execute("DELETE FROM categories WHERE categoryId=%s", (categoryId,))
+            BlobsDB.replaceRefs(cursor, 'category', categoryId, [])
+            bumpCacheVersion(cursor, 'categories', 'catalog')
             conn.commit()
+            invalidateCaches('categories', 'catalog')
         except Exception as e:
             logging.error(f"Ошибка deleteCategory: {e}")
             conn.rollback()
@@ -791,6 +1629,8 @@ class Categories:
         conn.close()
         return True
 
+categoriesCache = ReferenceCache('categories', Categories._loadAllCategories, referenceCacheTtl)
+
 # -------------------- Класс FavoritesDB -------------------- #
 class FavoritesDB:
     @staticmethod
@@ -807,6 +1647,7 @@ class FavoritesDB:
                 INSERT INTO favorites (userId, cardId)
                 VALUES (%s, %s)
             """, (userId, cardId))
+            FavoritesDB._shiftFavoriteCounts(cursor, [cardId], 1)
             conn.commit()
         except Exception as e:
             logging.error(f"Ошибка addFavorite: {e}")
@@ -827,24 +1668,75 @@ class FavoritesDB:
         if not conn:
             return []
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT f.favoriteId, f.cardId, c.cardName, c.description,
-                   c.address, c.locationLat, c.locationLng, c.website, c.createdAt
+        try:
+            cursor.execute("""
+                SELECT f.favoriteId, f.cardId, c.cardName, c.description,
+                       c.address, c.locationLat, c.locationLng, c.website, c.createdAt
+                FROM favorites f
+                JOIN cards c ON f.cardId = c.cardId
+                WHERE f.userId = %s
+                ORDER BY f.createdAt DESC
+            """, (userId,))
+            favoritesRows = cursor.fetchall()
+
+            for favoritesRow in favoritesRows:
+                favoritesRow['createdAt'] = favoritesRow['createdAt'].strftime('%Y-%m-%d %H:%M:%S')
+                favoritesRow['locationLat'] = str(favoritesRow['locationLat'])
+                favoritesRow['locationLng'] = str(favoritesRow['locationLng'])
+            favorites = [favoritesRow for favoritesRow in favoritesRows]
+        finally:
+            cursor.close()
+            conn.close()
+        return favorites
+
+    @staticmethod
+    def getFavoritesByCursor(userId: int, cursorToken=None, perPage=25):
+        """
+        Keyset-пагинация избранного по (createdAt, favoriteId) – индекс
+        idxFavoritesUserCreated (userId, createdAt) + первичный ключ.
+        Карточки полностью гидратируются (телефоны, соцсети, фото) пачкой,
+        страница – фиксированные 4 запроса независимо от perPage.
+        Возвращает { "favorites": [...], "nextCursor": <str или None> },
+        у каждой карточки есть favoriteId и favoritedAt.
+        При некорректном cursorToken бросает ValueError.
+        """
+        query = """
+            SELECT f.favoriteId, f.createdAt AS favoritedAt, c.*
             FROM favorites f
             JOIN cards c ON f.cardId = c.cardId
             WHERE f.userId = %s
-            ORDER BY f.createdAt DESC
-        """, (userId,))
-        favoritesRows = cursor.fetchall()
-
-        for favoritesRow in favoritesRows:
-            favoritesRow['createdAt'] = favoritesRow['createdAt'].strftime('%Y-%m-%d %H:%M:%S')
-            favoritesRow['locationLat'] = str(favoritesRow['locationLat'])
-            favoritesRow['locationLng'] = str(favoritesRow['locationLng'])
-        favorites = [favoritesRow for favoritesRow in favoritesRows]
-        cursor.close()
-        conn.close()
-        return favorites
+        """
+        params = [userId]
+        if cursorToken:
+            lastCreatedAt, lastFavoriteId = decodeCursor(cursorToken, 2)
+            lastCreatedAt = cursorDatetime(lastCreatedAt)
+            query += " AND (f.createdAt < %s OR (f.createdAt = %s AND f.favoriteId < %s))"
+            params.extend([lastCreatedAt, lastCreatedAt, cursorInt(lastFavoriteId)])
+        query += " ORDER BY f.createdAt DESC, f.favoriteId DESC LIMIT %s"
+        params.append(perPage + 1)
+
+        conn = connect()
+        if not conn:
+            return {"favorites": [], "nextCursor": None}
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, tuple(params))
+            rows = cursor.fetchall()
+            hasMore = len(rows) > perPage
+            rows = rows[:perPage]
+            cards = Cards.hydrateCards(cursor, rows)
+        finally:
+            cursor.close()
+            conn.close()
+
+        for card, row in zip(cards, rows):
+            card["favoriteId"] = row["favoriteId"]
+            card["favoritedAt"] = str(row["favoritedAt"])
+        nextCursor = None
+        if hasMore and rows:
+            last = rows[-1]
+            nextCursor = encodeCursor(last["favoritedAt"], last["favoriteId"])
+        return {"favorites": cards, "nextCursor": nextCursor}
 
     @staticmethod
     def removeFavorite(userId: int, cardId: int):
@@ -857,6 +1749,8 @@ class FavoritesDB:
         cursor = conn.cursor()
         try:
             cursor.execute("DELETE FROM favorites WHERE userId=%s AND cardId=%s", (userId, cardId))
+            if cursor.rowcount:
+                FavoritesDB._shiftFavoriteCounts(cursor, [cardId], -1)
             conn.commit()
         except Exception as e:
             logging.error(f"Ошибка removeFavorite: {e}")
@@ -868,6 +1762,99 @@ class FavoritesDB:
         conn.close()
         return True
 
+    @staticmethod
+    def updateFavorites(userId: int, addCardIds=(), removeCardIds=()):
+        """
+        Пакетное добавление/удаление избранного одной транзакцией:
+        по одному мультистрочному запросу на добавление и на удаление.
+        Несуществующие карточки и уже добавленные пропускаются.
+        Текущие строки пользователя читаются с блокировкой (FOR UPDATE), поэтому
+        параллельный пакет того же пользователя ждёт, и favoriteCount меняется
+        ровно на число реально добавленных/удалённых строк.
+        Возвращает {"added": N, "removed": N} или None при ошибке.
+        """
+        conn = connect()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        result = {"added": 0, "removed": 0}
+        try:
+            allIds = list(dict.fromkeys([*addCardIds, *removeCardIds]))
+            placeholders = ", ".join(["%s"] * len(allIds))
+            cursor.execute(f"""
+                SELECT cardId FROM favorites
+                WHERE userId=%s AND cardId IN ({placeholders}) FOR UPDATE
+            """, (userId, *allIds))
+            existing = {row[0] for row in cursor.fetchall()}
+
+            addIds = [cardId for cardId in addCardIds if cardId not in existing]
+            removeIds = [cardId for cardId in removeCardIds if cardId in existing]
+            if addIds:
+                placeholders = ", ".join(["%s"] * len(addIds))
+                cursor.execute(f"""
+                    INSERT IGNORE INTO favorites (userId, cardId)
+                    SELECT %s, cardId FROM cards WHERE cardId IN ({placeholders})
+                """, (userId, *addIds))
+                result["added"] = cursor.rowcount
+                FavoritesDB._shiftFavoriteCounts(cursor, addIds, 1)
+            if removeIds:
+                placeholders = ", ".join(["%s"] * len(removeIds))
+                cursor.execute(f"""
+                    DELETE FROM favorites WHERE userId=%s AND cardId IN ({placeholders})
+                """, (userId, *removeIds))
+                result["removed"] = cursor.rowcount
+                FavoritesDB._shiftFavoriteCounts(cursor, removeIds, -1)
+            conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка updateFavorites: {e}")
+            conn.rollback()
+            return None
+        finally:
+            cursor.close()
+            conn.close()
+        return result
+
+    @staticmethod
+    def _shiftFavoriteCounts(cursor, cardIds, delta):
+        """
+        cards.favoriteCount += delta одним UPDATE для всех cardIds (атомарный
+        инкремент в строке, без COUNT(*)). Версия карточки тоже растёт, чтобы
+        ETag одиночной карточки отражал новый счётчик, а updatedAt остаётся
+        прежним: лайк – не правка карточки, сортировка не должна меняться
+        (одиночная карточка поэтому валидируется только по ETag). Каталог
+        ('catalog') не сбрасывается: он пересобирается по popularCatalogMaxAge.
+        """
+        placeholders = ", ".join(["%s"] * len(cardIds))
+        cursor.execute(f"""
+            UPDATE cards
+            SET favoriteCount = GREATEST(favoriteCount + %s, 0), version = version + 1,
+                updatedAt = updatedAt
+            WHERE cardId IN ({placeholders})
+        """, (delta, *cardIds))
+
+    @staticmethod
+    def getFavoriteCardIds(userId: int, cardIds):
+        """
+        Какие из cardIds у пользователя в избранном – один запрос
+        по уникальному индексу uniqueFavorite (userId, cardId).
+        """
+        if not cardIds:
+            return []
+        conn = connect()
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        try:
+            placeholders = ", ".join(["%s"] * len(cardIds))
+            cursor.execute(f"""
+                SELECT cardId FROM favorites WHERE userId=%s AND cardId IN ({placeholders})
+            """, (userId, *cardIds))
+            favoriteIds = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+        return favoriteIds
+
 # -------------------- Класс TariffsDB -------------------- #
 class TariffsDB:
     @staticmethod
@@ -886,8 +1873,10 @@ class TariffsDB:
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (tariffName, minPhones, maxPhones, minSocials, maxSocials,
                   minPhotos, maxPhotos, maxDescLength, websiteAllowed))
-            conn.commit()
             tariffId = cursor.lastrowid
+            bumpCacheVersion(cursor, 'tariffs')
+            conn.commit()
+            invalidateCaches('tariffs')
         except Exception as e:
             logging.error(f"Ошибка createTariff: {e}")
             conn.rollback()
@@ -898,15 +1887,18 @@ class TariffsDB:
 
     @staticmethod
     def getTariffById(tariffId):
-        conn = connect()
-        if not conn:
+        """Тариф из кэша справочников (см. ReferenceCache)."""
+        tariffs = tariffsCache.get()
+        if tariffs is None:
             return None
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM tariffs WHERE tariffId=%s", (tariffId,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return row
+        try:
+            tariffId = int(tariffId)
+        except (TypeError, ValueError):
+            return None
+        for row in tariffs:
+            if row["tariffId"] == tariffId:
+                return dict(row)
+        return None
 
     @staticmethod
     def updateTariff(tariffId, **kwargs):
@@ -932,7 +1924,9 @@ class TariffsDB:
         cursor = conn.cursor()
         try:
             cursor.execute(query, tuple(params))
+            bumpCacheVersion(cursor, 'tariffs')
             conn.commit()
+            invalidateCaches('tariffs')
         except Exception as e:
             logging.error(f"Ошибка updateTariff: {e}")
             conn.rollback()
@@ -951,7 +1945,9 @@ class TariffsDB:
         cursor = conn.cursor()
         try:
             cursor.execute("DELETE FROM tariffs WHERE tariffId=%s", (tariffId,))
+            bumpCacheVersion(cursor, 'tariffs')
             conn.commit()
+            invalidateCaches('tariffs')
         except Exception as e:
             logging.error(f"Ошибка deleteTariff: {e}")
             conn.rollback()
@@ -964,16 +1960,30 @@ class TariffsDB:
 
     @staticmethod
     def getAllTariffs():
+        tariffs = tariffsCache.get()
+        if tariffs is None:
+            return []
+        return [dict(row) for row in tariffs]
+
+    @staticmethod
+    def _loadAllTariffs():
         conn = connect()
         if not conn:
-            return []
+            return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM tariffs ORDER BY tariffId")
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM tariffs ORDER BY tariffId")
+            rows = cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Ошибка _loadAllTariffs: {e}")
+            rows = None
+        finally:
+            cursor.close()
+            conn.close()
         return rows
 
+tariffsCache = ReferenceCache('tariffs', TariffsDB._loadAllTariffs, referenceCacheTtl)
+
 # -------------------- Класс PromotionsDB -------------------- #
 class PromotionsDB:
     @staticmethod
@@ -982,36 +1992,13 @@ class PromotionsDB:
         if not conn:
             return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM promotions WHERE promotionId=%s", (promotionId,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return row
-
-    @staticmethod
-    def activatePromotion(cardId, promotionId, durationDays):
-        """
-        Создаёт запись в cardPromotions, где endDate = startDate + durationDays.
-        """
-        conn = connect()
-        if not conn:
-            return None
-        cursor = conn.cursor()
-        cpId = None
         try:
-            cursor.execute("""
-                INSERT INTO cardPromotions (cardId, promotionId, startDate, endDate)
-                VALUES (%s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s DAY))
-            """, (cardId, promotionId, durationDays))
-            conn.commit()
-            cpId = cursor.lastrowid
-        except Exception as e:
-            logging.error(f"Ошибка activatePromotion: {e}")
-            conn.rollback()
+            cursor.execute("SELECT * FROM promotions WHERE promotionId=%s", (promotionId,))
+            row = cursor.fetchone()
         finally:
             cursor.close()
             conn.close()
-        return cpId
+        return row
 
 # -------------------- Класс PaymentsDB -------------------- #
 class PaymentsDB:
@@ -1049,30 +2036,218 @@ class PaymentsDB:
         if not conn:
             return None
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM payments WHERE orderId=%s", (orderId,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM payments WHERE orderId=%s", (orderId,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        return row
+
+    @staticmethod
+    def getPaymentByTransactionId(transactionId):
+        conn = connect()
+        if not conn:
+            return None
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM payments WHERE transactionId=%s", (transactionId,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
         return row
 
+    # ----------------------------------------------------------------
+    # RPC Payme: каждый метод – одна транзакция с блокировкой строки платежа
+    # (SELECT ... FOR UPDATE), повторный вызов возвращает сохранённый результат.
+    # Возвращают (строка payments после операции, None) или (None, код ошибки):
+    # orderNotFound, wrongAmount, orderBusy, transactionNotFound,
+    # cannotPerform, cannotCancel, dbError.
+    # ----------------------------------------------------------------
+    @staticmethod
+    def _lockPayment(cursor, orderId=None, transactionId=None):
+        if orderId is not None:
+            cursor.execute("SELECT * FROM payments WHERE orderId=%s FOR UPDATE", (orderId,))
+        else:
+            cursor.execute("SELECT * FROM payments WHERE transactionId=%s FOR UPDATE", (transactionId,))
+        return cursor.fetchone()
+
+    @staticmethod
+    def _runPaymentRpc(name, action):
+        """Открывает транзакцию, вызывает action(cursor) -> (row, error), коммитит или откатывает."""
+        conn = connect()
+        if not conn:
+            return None, "dbError"
+        cursor = conn.cursor(dictionary=True)
+        try:
+            row, error = action(cursor)
+            if error:
+                conn.rollback()
+                return None, error
+            conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка {name}: {e}")
+            conn.rollback()
+            return None, "dbError"
+        finally:
+            cursor.close()
+            conn.close()
+        return row, None
+
+    @staticmethod
+    def createTransaction(orderId, transactionId, amount, nowMs):
+        """state 0 -> 1. Повтор с тем же transactionId – прежний createTime."""
+        def action(cursor):
+            row = PaymentsDB._lockPayment(cursor, orderId=orderId)
+            if not row:
+                return None, "orderNotFound"
+            if row["amount"] != amount:
+                return None, "wrongAmount"
+            if row["transactionId"] and row["transactionId"] != transactionId:
+                return None, "orderBusy"
+            if row["state"] == 1:
+                return row, None
+            if row["state"] != 0:
+                return None, "cannotPerform"
+            cursor.execute("""
+                UPDATE payments SET state=1, transactionId=%s, createTime=%s
+                WHERE paymentId=%s
+            """, (transactionId, nowMs, row["paymentId"]))
+            row.update(state=1, transactionId=transactionId, createTime=nowMs)
+            return row, None
+        return PaymentsDB._runPaymentRpc("createTransaction", action)
+
+    @staticmethod
+    def performTransaction(transactionId, nowMs):
+        """
+        state 1 -> 2 и выдача оплаченного в той же транзакции:
+          tariff – один UPDATE cards SET tariffId;
+          promotion – один INSERT ... SELECT в cardPromotions (срок из promotions).
+        Повтор – прежний performTime без повторной выдачи.
+        """
+        def action(cursor):
+            row = PaymentsDB._lockPayment(cursor, transactionId=transactionId)
+            if not row:
+                return None, "transactionNotFound"
+            if row["state"] == 2:
+                return row, None
+            if row["state"] != 1:
+                return None, "cannotPerform"
+            cursor.execute("UPDATE payments SET state=2, performTime=%s WHERE paymentId=%s",
+                           (nowMs, row["paymentId"]))
+            if row["paymentType"] == "tariff":
+                cursor.execute("""
+                    UPDATE cards SET tariffId=%s, version = version + 1 WHERE cardId=%s
+                """, (row["tariffId"], row["cardId"]))
+            elif row["paymentType"] == "promotion":
+                cursor.execute("""
+                    INSERT INTO cardPromotions (cardId, promotionId, startDate, endDate)
+                    SELECT %s, promotionId, NOW(), DATE_ADD(NOW(), INTERVAL durationDays DAY)
+                    FROM promotions WHERE promotionId=%s
+                """, (row["cardId"], row["promotionId"]))
+            bumpCacheVersion(cursor, 'catalog')
+            row.update(state=2, performTime=nowMs)
+            return row, None
+        row, error = PaymentsDB._runPaymentRpc("performTransaction", action)
+        if row and row["performTime"] == nowMs:
+            invalidateCaches('catalog')
+        return row, error
+
+    @staticmethod
+    def cancelTransaction(transactionId, reason, nowMs):
+        """
+        state 1 -> -1. Выполненный платёж (state 2) не отменяется – услуга уже выдана.
+        Повтор – прежний cancelTime.
+        """
+        def action(cursor):
+            row = PaymentsDB._lockPayment(cursor, transactionId=transactionId)
+            if not row:
+                return None, "transactionNotFound"
+            if row["state"] == -1:
+                return row, None
+            if row["state"] == 2:
+                return None, "cannotCancel"
+            cursor.execute("""
+                UPDATE payments SET state=-1, reason=%s, cancelTime=%s
+                WHERE paymentId=%s
+            """, (reason, nowMs, row["paymentId"]))
+            row.update(state=-1, reason=reason, cancelTime=nowMs)
+            return row, None
+        return PaymentsDB._runPaymentRpc("cancelTransaction", action)
+
+# -------------------- Класс EmailOutboxDB -------------------- #
+class EmailOutboxDB:
+    @staticmethod
+    def enqueue(cursor, recipient, subject, body):
+        """
+        Ставит письмо в очередь. Вызывается на курсоре вызывающей транзакции,
+        чтобы письмо и данные, ради которых оно отправляется, фиксировались вместе.
+        """
+        cursor.execute("""
+            INSERT INTO emailOutbox (recipient, subject, body)
+            VALUES (%s, %s, %s)
+        """, (recipient, subject, body))
+        return cursor.lastrowid
+
     @staticmethod
-    def updatePaymentOnCreateTransaction(orderId, transactionId):
+    def claimBatch(limit, leaseSeconds):
         """
-        Ставим state=1, прописываем transactionId.
+        Забирает до limit писем, готовых к отправке, и помечает их status='sending'
+        с арендой на leaseSeconds (если воркер упадёт, письма вернутся в очередь).
+        SKIP LOCKED позволяет нескольким воркерам разбирать очередь параллельно.
         """
         conn = connect()
+        if not conn:
+            return []
+        cursor = conn.cursor(dictionary=True)
+        rows = []
+        try:
+            cursor.execute("""
+                SELECT outboxId, recipient, subject, body, attempts
+                FROM emailOutbox
+                WHERE status IN ('pending', 'sending') AND nextAttemptAt <= NOW()
+                ORDER BY nextAttemptAt
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (limit,))
+            rows = cursor.fetchall()
+            if rows:
+                ids = [row["outboxId"] for row in rows]
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(f"""
+                    UPDATE emailOutbox
+                    SET status='sending', nextAttemptAt = NOW() + INTERVAL %s SECOND
+                    WHERE outboxId IN ({placeholders})
+                """, (leaseSeconds, *ids))
+            conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка claimBatch: {e}")
+            conn.rollback()
+            rows = []
+        finally:
+            cursor.close()
+            conn.close()
+        return rows
+
+    @staticmethod
+    def markSent(outboxIds):
+        if not outboxIds:
+            return True
+        conn = connect()
         if not conn:
             return False
         cursor = conn.cursor()
         try:
-            cursor.execute("""
-                UPDATE payments
-                SET state=1, transactionId=%s
-                WHERE orderId=%s
-            """, (transactionId, orderId))
+            placeholders = ", ".join(["%s"] * len(outboxIds))
+            cursor.execute(f"""
+                UPDATE emailOutbox
+                SET status='sent', sentAt=NOW(), attempts=attempts+1, lastError=NULL
+                WHERE outboxId IN ({placeholders})
+            """, tuple(outboxIds))
             conn.commit()
         except Exception as e:
-            logging.error(f"Ошибка updatePaymentOnCreateTransaction: {e}")
+            logging.error(f"Ошибка markSent: {e}")
             conn.rollback()
             cursor.close()
             conn.close()
@@ -1082,23 +2257,24 @@ class PaymentsDB:
         return True
 
     @staticmethod
-    def updatePaymentOnPerform(orderId):
-        """
-        Ставим state=2 (performed).
-        """
+    def releaseLease(outboxIds):
+        """Вернуть взятые, но не отправленные письма в очередь без увеличения attempts."""
+        if not outboxIds:
+            return True
         conn = connect()
         if not conn:
             return False
         cursor = conn.cursor()
         try:
-            cursor.execute("""
-                UPDATE payments
-                SET state=2
-                WHERE orderId=%s
-            """, (orderId,))
+            placeholders = ", ".join(["%s"] * len(outboxIds))
+            cursor.execute(f"""
+                UPDATE emailOutbox
+                SET status='pending', nextAttemptAt=NOW()
+                WHERE status='sending' AND outboxId IN ({placeholders})
+            """, tuple(outboxIds))
             conn.commit()
         except Exception as e:
-            logging.error(f"Ошибка updatePaymentOnPerform: {e}")
+            logging.error(f"Ошибка releaseLease: {e}")
             conn.rollback()
             cursor.close()
             conn.close()
@@ -1108,23 +2284,32 @@ class PaymentsDB:
         return True
 
     @staticmethod
-    def updatePaymentOnCancel(orderId, reason):
+    def markFailed(outboxId, error, retryDelay):
         """
-        Ставим state=-1 (canceled), reason=<причина>.
+        Неудачная попытка: retryDelay – через сколько секунд повторить,
+        None – попыток больше не будет (status='failed').
         """
         conn = connect()
         if not conn:
             return False
         cursor = conn.cursor()
         try:
-            cursor.execute("""
-                UPDATE payments
-                SET state=-1, reason=%s
-                WHERE orderId=%s
-            """, (reason, orderId))
+            if retryDelay is None:
+                cursor.execute("""
+                    UPDATE emailOutbox
+                    SET status='failed', attempts=attempts+1, lastError=%s
+                    WHERE outboxId=%s
+                """, (str(error)[:500], outboxId))
+            else:
+                cursor.execute("""
+                    UPDATE emailOutbox
+                    SET status='pending', attempts=attempts+1, lastError=%s,
+                        nextAttemptAt = NOW() + INTERVAL %s SECOND
+                    WHERE outboxId=%s
+                """, (str(error)[:500], retryDelay, outboxId))
             conn.commit()
         except Exception as e:
-            logging.error(f"Ошибка updatePaymentOnCancel: {e}")
+            logging.error(f"Ошибка markFailed: {e}")
             conn.rollback()
             cursor.close()
             conn.close()
@@ -1132,3 +2317,46 @@ class PaymentsDB:
         cursor.close()
         conn.close()
         return True
+
+# -------------------- Класс BlobsDB -------------------- #
+class BlobsDB:
+    """
+    Ссылки на файлы контентно-адресуемого хранилища (api/images.py).
+    Все методы работают на курсоре вызывающей транзакции, чтобы ссылки
+    менялись вместе с карточкой / профилем / категорией.
+    """
+    @staticmethod
+    def addRefs(cursor, ownerType, ownerId, blobIds):
+        BlobsDB.addRefRows(cursor, [(ownerType, ownerId, blobId) for blobId in blobIds])
+
+    @staticmethod
+    def addRefRows(cursor, rows):
+        """
+        rows – [(ownerType, ownerId, blobId), ...]; один мультистрочный INSERT IGNORE.
+        executemany коннектор склеивает только для обычного INSERT INTO ... VALUES,
+        поэтому VALUES собираем сами – один запрос вместо N.
+        """
+        rows = list(dict.fromkeys(rows))
+        if not rows:
+            return
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(rows))
+        cursor.execute(f"""
+            INSERT IGNORE INTO blobRefs (ownerType, ownerId, blobId)
+            VALUES {placeholders}
+        """, tuple(value for row in rows for value in row))
+
+    @staticmethod
+    def removeRefs(cursor, ownerType, ownerId, blobIds):
+        if not blobIds:
+            return
+        blobIds = list(blobIds)
+        placeholders = ", ".join(["%s"] * len(blobIds))
+        cursor.execute(f"""
+            DELETE FROM blobRefs
+            WHERE ownerType=%s AND ownerId=%s AND blobId IN ({placeholders})
+        """, (ownerType, ownerId, *blobIds))
+
+    @staticmethod
+    def replaceRefs(cursor, ownerType, ownerId, blobIds):
+        cursor.execute("DELETE FROM blobRefs WHERE ownerType=%s AND ownerId=%s", (ownerType, ownerId))
+        BlobsDB.addRefs(cursor, ownerType, ownerId, blobIds)
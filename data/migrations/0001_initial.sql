@@ -0,0 +1,121 @@
+-- 0001: исходная схема (то, что раньше создавал initDB)
+
+-- Таблица users
+CREATE TABLE IF NOT EXISTS users (
+    userId INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) NOT NULL UNIQUE,
+    fullName VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    avatar VARCHAR(255) DEFAULT NULL,
+    emailConfirmation TINYINT(1) DEFAULT 0,
+    confirmationCode VARCHAR(50) DEFAULT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Таблица categories
+CREATE TABLE IF NOT EXISTS categories (
+    categoryId INT AUTO_INCREMENT PRIMARY KEY,
+    categoryName VARCHAR(255) NOT NULL
+) ENGINE=InnoDB;
+
+-- Таблица tariffs
+CREATE TABLE IF NOT EXISTS tariffs (
+    tariffId INT AUTO_INCREMENT PRIMARY KEY,
+    tariffName VARCHAR(255) NOT NULL,
+    minPhones INT NOT NULL DEFAULT 1,
+    maxPhones INT NOT NULL DEFAULT 1,
+    minSocials INT NOT NULL DEFAULT 0,
+    maxSocials INT NOT NULL DEFAULT 1,
+    minPhotos INT NOT NULL DEFAULT 1,
+    maxPhotos INT NOT NULL DEFAULT 1,
+    maxDescriptionLength INT NOT NULL DEFAULT 200,
+    websiteAllowed TINYINT(1) NOT NULL DEFAULT 0,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Таблица promotions
+CREATE TABLE IF NOT EXISTS promotions (
+    promotionId INT AUTO_INCREMENT PRIMARY KEY,
+    promotionName VARCHAR(255) NOT NULL,
+    description VARCHAR(255) DEFAULT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Таблица cardPromotions
+CREATE TABLE IF NOT EXISTS cardPromotions (
+    cardPromotionId INT AUTO_INCREMENT PRIMARY KEY,
+    cardId INT NOT NULL,
+    promotionId INT NOT NULL,
+    startDate DATETIME DEFAULT CURRENT_TIMESTAMP,
+    endDate DATETIME
+) ENGINE=InnoDB;
+
+-- Таблица cards
+CREATE TABLE IF NOT EXISTS cards (
+    cardId INT AUTO_INCREMENT PRIMARY KEY,
+    userId INT NOT NULL,
+    categoryId INT NOT NULL,
+    tariffId INT NOT NULL,
+    cardName VARCHAR(255) NOT NULL,
+    description TEXT,
+    address VARCHAR(255),
+    locationLat DECIMAL(10, 6) DEFAULT NULL,
+    locationLng DECIMAL(10, 6) DEFAULT NULL,
+    website VARCHAR(255) DEFAULT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Таблица cardPhoneNumbers
+CREATE TABLE IF NOT EXISTS cardPhoneNumbers (
+    phoneId INT AUTO_INCREMENT PRIMARY KEY,
+    cardId INT NOT NULL,
+    phoneNumber VARCHAR(20) NOT NULL,
+    FOREIGN KEY (cardId) REFERENCES cards(cardId)
+) ENGINE=InnoDB;
+
+-- Таблица cardSocialMedia
+CREATE TABLE IF NOT EXISTS cardSocialMedia (
+    socialId INT AUTO_INCREMENT PRIMARY KEY,
+    cardId INT NOT NULL,
+    socialType VARCHAR(100) NOT NULL,
+    socialLink VARCHAR(255) NOT NULL,
+    FOREIGN KEY (cardId) REFERENCES cards(cardId)
+) ENGINE=InnoDB;
+
+-- Таблица cardPhotos
+CREATE TABLE IF NOT EXISTS cardPhotos (
+    photoId INT AUTO_INCREMENT PRIMARY KEY,
+    cardId INT NOT NULL,
+    photoUrl VARCHAR(255) NOT NULL,
+    FOREIGN KEY (cardId) REFERENCES cards(cardId)
+) ENGINE=InnoDB;
+
+-- Таблица favorites
+CREATE TABLE IF NOT EXISTS favorites (
+    favoriteId INT AUTO_INCREMENT PRIMARY KEY,
+    userId INT NOT NULL,
+    cardId INT NOT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (userId) REFERENCES users(userId),
+    FOREIGN KEY (cardId) REFERENCES cards(cardId),
+    UNIQUE KEY uniqueFavorite (userId, cardId)
+) ENGINE=InnoDB;
+
+-- Таблица payments
+CREATE TABLE IF NOT EXISTS payments (
+    paymentId INT AUTO_INCREMENT PRIMARY KEY,
+    userId INT NOT NULL,
+    cardId INT NOT NULL,           -- к какой карточке относится оплата
+    paymentType VARCHAR(50) NOT NULL,   -- 'tariff' или 'promotion'
+    tariffId INT DEFAULT NULL,     -- если paymentType='tariff', указываем tariffId
+    promotionId INT DEFAULT NULL,  -- если paymentType='promotion', указываем promotionId
+    orderId VARCHAR(255) NOT NULL UNIQUE,
+    amount INT NOT NULL,           -- сумма в тийинах
+    transactionId VARCHAR(255) DEFAULT NULL,
+    state INT NOT NULL DEFAULT 0,  -- 0=pending, 1=created, 2=performed, -1=canceled
+    reason INT DEFAULT NULL,       -- причина отмены, если state=-1
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
@@ -0,0 +1,20 @@
+-- 0002: вторичные индексы под реальные запросы data/db.py
+
+-- Cards.getCards / getCardsByCursor: WHERE categoryId=? ORDER BY createdAt DESC, cardId DESC
+-- (cardId как первичный ключ входит в любой вторичный индекс InnoDB)
+CREATE INDEX idxCardsCategoryCreated ON cards (categoryId, createdAt);
+
+-- Cards.getCards с фильтром userId (мои карточки, профиль)
+CREATE INDEX idxCardsUserCreated ON cards (userId, createdAt);
+
+-- Лента без фильтров: ORDER BY createdAt DESC, cardId DESC
+CREATE INDEX idxCardsCreated ON cards (createdAt);
+
+-- Активные промо карточки: WHERE cardId=? AND endDate > NOW()
+CREATE INDEX idxCardPromotionsCardEnd ON cardPromotions (cardId, endDate);
+
+-- Очистка / выборка истекающих промо по endDate
+CREATE INDEX idxCardPromotionsEnd ON cardPromotions (endDate);
+
+-- FavoritesDB.getFavorites: WHERE userId=? ORDER BY createdAt DESC
+CREATE INDEX idxFavoritesUserCreated ON favorites (userId, createdAt);
@@ -0,0 +1,11 @@
+-- 0003: колонки, которые код уже использует, но которых не было в исходной схеме
+
+-- Categories.addCategory / updateCategory
+ALTER TABLE categories ADD COLUMN logo VARCHAR(255) DEFAULT NULL;
+
+-- PaymentsGenerate: сумма тарифа в тийинах
+ALTER TABLE tariffs ADD COLUMN price INT NOT NULL DEFAULT 0;
+
+-- PaymentsGenerate / PaymeWebhook: сумма и длительность промо
+ALTER TABLE promotions ADD COLUMN price INT NOT NULL DEFAULT 0;
+ALTER TABLE promotions ADD COLUMN durationDays INT NOT NULL DEFAULT 7;
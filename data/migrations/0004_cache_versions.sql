@@ -0,0 +1,7 @@
+-- 0004: версии кэшируемых справочников (см. ReferenceCache в data/db.py)
+CREATE TABLE IF NOT EXISTS cacheVersions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB;
+
+INSERT IGNORE INTO cacheVersions (name, version) VALUES ('categories', 0), ('tariffs', 0);
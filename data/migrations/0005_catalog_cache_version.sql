@@ -0,0 +1,2 @@
+-- 0005: версия каталога для кэша ответа /api/categories/with_cards
+INSERT IGNORE INTO cacheVersions (name, version) VALUES ('catalog', 0);
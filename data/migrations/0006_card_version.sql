@@ -0,0 +1,4 @@
+-- 0006: счётчик версий карточки для условных GET (ETag).
+-- Увеличивается при любом изменении карточки, включая телефоны, соцсети и фото;
+-- updatedAt при этом обновляется автоматически (ON UPDATE CURRENT_TIMESTAMP).
+ALTER TABLE cards ADD COLUMN version INT NOT NULL DEFAULT 0;
@@ -0,0 +1,14 @@
+-- 0007: очередь исходящих писем (отправляет фоновый воркер api/mailer.py)
+CREATE TABLE IF NOT EXISTS emailOutbox (
+    outboxId INT AUTO_INCREMENT PRIMARY KEY,
+    recipient VARCHAR(255) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body MEDIUMTEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',  -- pending / sending / sent / failed
+    attempts INT NOT NULL DEFAULT 0,
+    nextAttemptAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- для sending: конец аренды
+    lastError VARCHAR(500) DEFAULT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sentAt DATETIME DEFAULT NULL,
+    KEY idxEmailOutboxStatusNext (status, nextAttemptAt)
+) ENGINE=InnoDB;
@@ -0,0 +1,5 @@
+-- 0008: ссылки на уменьшенные копии изображений (api/images.py)
+ALTER TABLE cardPhotos ADD COLUMN thumbUrl VARCHAR(255) DEFAULT NULL;
+ALTER TABLE cardPhotos ADD COLUMN detailUrl VARCHAR(255) DEFAULT NULL;
+ALTER TABLE users ADD COLUMN avatarThumb VARCHAR(255) DEFAULT NULL;
+ALTER TABLE categories ADD COLUMN logoThumb VARCHAR(255) DEFAULT NULL;
@@ -0,0 +1,12 @@
+-- 0009: контентно-адресуемые загрузки (api/images.py::storeImageUpload)
+-- blobId – sha256 содержимого файла; blobRefs – кто ссылается на файл
+ALTER TABLE cardPhotos ADD COLUMN blobId CHAR(64) DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS blobRefs (
+    ownerType VARCHAR(20) NOT NULL,   -- 'card' / 'avatar' / 'category'
+    ownerId INT NOT NULL,
+    blobId CHAR(64) NOT NULL,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ownerType, ownerId, blobId),
+    KEY idxBlobRefsBlob (blobId)
+) ENGINE=InnoDB;
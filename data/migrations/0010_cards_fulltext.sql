@@ -0,0 +1,2 @@
+-- 0010: полнотекстовый поиск по карточкам (Cards.searchCards)
+ALTER TABLE cards ADD FULLTEXT INDEX ftCardsText (cardName, description, address);
@@ -0,0 +1,9 @@
+-- 0011: геоточка карточки для поиска "рядом" (Cards.getNearbyCards).
+-- POINT(lng, lat) в градусах, SRID 0; SPATIAL-индекс требует NOT NULL,
+-- поэтому карточки без координат хранят POINT(0, 0) и отсекаются
+-- по locationLat IS NOT NULL. Поддерживается в Cards.insertCardRow и
+-- CardWriter.updateCard/patchCard (GEO_POINT_SQL в data/db.py).
+ALTER TABLE cards ADD COLUMN geoPoint POINT NULL;
+UPDATE cards SET geoPoint = POINT(COALESCE(locationLng, 0), COALESCE(locationLat, 0));
+ALTER TABLE cards MODIFY geoPoint POINT NOT NULL SRID 0;
+ALTER TABLE cards ADD SPATIAL INDEX spCardsGeoPoint (geoPoint);
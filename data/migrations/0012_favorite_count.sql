@@ -0,0 +1,9 @@
+-- 0012: денормализованный счётчик избранного (FavoritesDB поддерживает его
+-- в той же транзакции, что и favorites) и индексы под sort=popular
+ALTER TABLE cards ADD COLUMN favoriteCount INT NOT NULL DEFAULT 0;
+UPDATE cards c SET favoriteCount = (SELECT COUNT(*) FROM favorites f WHERE f.cardId = c.cardId);
+
+-- Cards.getCards / getCardsByCursor (sort=popular): ORDER BY favoriteCount DESC, cardId DESC
+CREATE INDEX idxCardsFavoriteCount ON cards (favoriteCount);
+-- То же с фильтром по категории и окно getTopCardsPerCategory
+CREATE INDEX idxCardsCategoryFavoriteCount ON cards (categoryId, favoriteCount);
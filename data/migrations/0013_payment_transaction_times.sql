@@ -0,0 +1,9 @@
+-- 0013: Payme-вебхук как идемпотентный автомат состояний (PaymentsDB.*Transaction).
+-- Время операций (мс, как его видит Payme) хранится, чтобы повторные вызовы
+-- Create/Perform/Cancel/CheckTransaction возвращали тот же результат.
+ALTER TABLE payments ADD COLUMN createTime BIGINT DEFAULT NULL;
+ALTER TABLE payments ADD COLUMN performTime BIGINT DEFAULT NULL;
+ALTER TABLE payments ADD COLUMN cancelTime BIGINT DEFAULT NULL;
+
+-- Perform/Cancel/CheckTransaction приходят только с id транзакции Payme
+CREATE INDEX idxPaymentsTransaction ON payments (transactionId);
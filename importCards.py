@@ -0,0 +1,42 @@
+"""
+Массовый импорт карточек из CSV или NDJSON (формат – см. api/cardImport.py).
+    python importCards.py vendor.csv --owner 42
+    python importCards.py vendor.ndjson --owner 42 --chunk-size 500
+Печатает отчёт в JSON: сколько записано, ошибки по строкам, строк в секунду.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from api.cardImport import importCards, detectFormat, FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт карточек")
+    parser.add_argument("path", help="файл .csv или .ndjson")
+    parser.add_argument("--owner", type=int, required=True,
+                        help="userId владельца для записей без userId")
+    parser.add_argument("--format", choices=FORMATS, help="по умолчанию – по расширению файла")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="записей в одной транзакции (по умолчанию importChunkSize)")
+    args = parser.parse_args()
+
+    # api/__init__ уже настроил логирование в файл, basicConfig здесь ничего не сделает:
+    # прогресс дублируем в stderr (stdout занят JSON-отчётом)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+    logging.getLogger().addHandler(console)
+    fmt = args.format or detectFormat(args.path)
+    if not fmt:
+        parser.error("не удалось определить формат, укажите --format")
+
+    with open(args.path, encoding="utf-8-sig", newline="") as stream:
+        report = importCards(stream, fmt, args.owner, chunkSize=args.chunk_size)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
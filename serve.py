@@ -0,0 +1,58 @@
+"""
+Production-запуск: gunicorn с pre-fork воркерами и потоками в каждом.
+    python serve.py
+Параметры берутся из data.config (serverWorkers, serverThreads, serverTimeout, ...).
+Плавный перезапуск воркеров без потери запросов: kill -HUP <pid мастера>.
+Мастер не импортирует код приложения (без preload_app), поэтому после HUP
+новые воркеры загружают свежий код – выкладка кода не требует рестарта.
+Изменения в serve.py и data/config.py подхватываются только полным перезапуском.
+"""
+import logging
+from gunicorn.app.base import BaseApplication
+
+from data.config import (
+    ip, port, serverWorkers, serverThreads, serverTimeout,
+    serverGracefulTimeout, serverKeepAlive, serverMaxRequests
+)
+
+
+def postFork(server, worker):
+    # Уже в воркере: миграции сериализуются через GET_LOCK, при актуальной
+    # схеме это один SELECT
+    from data.db import initDB
+    initDB()
+
+
+class WeddayServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Вызывается в воркере после fork: код приложения импортируется здесь
+        from api import createApp, warmUp
+        app = createApp()
+        warmUp()
+        return app
+
+
+if __name__ == '__main__':
+    options = {
+        "bind": f"{ip or '0.0.0.0'}:{port or 5000}",
+        "workers": serverWorkers,
+        "worker_class": "gthread",
+        "threads": serverThreads,
+        "timeout": serverTimeout,
+        "graceful_timeout": serverGracefulTimeout,
+        "keepalive": serverKeepAlive,
+        # Перезапуск воркера после N запросов (со случайным разбросом) – защита от утечек
+        "max_requests": serverMaxRequests,
+        "max_requests_jitter": serverMaxRequests // 10,
+        "post_fork": postFork,
+    }
+    logging.info(f"Запуск gunicorn: {options['bind']}, воркеров {serverWorkers} x потоков {serverThreads}")
+    WeddayServer(options).run()